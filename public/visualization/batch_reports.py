@@ -0,0 +1,263 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from temperature_data import load_workers_from_env
+from temperature_dataset import discover_csv_files
+
+# Usage:
+#   python batch_reports.py phoenix:1990:2024 tucson:1990:2024
+#   python batch_reports.py --all --compare-year 2024 --out-dir reports
+# Each job writes {station}_{baseline}_vs_{comparison}.html; jobs whose CSVs
+# and build options are unchanged since the last run are skipped.
+
+# Bump when report output changes so every report is rebuilt once
+REPORT_VERSION = 4
+MANIFEST_NAME = '.report_manifest.json'
+
+REPORT_CONFIG = {
+    'scrollZoom': True,
+    'displayModeBar': True,
+    'responsive': True
+}
+
+
+# "station:baseline:comparison" -> (station, baseline, comparison)
+def parse_job(text):
+    parts = text.split(':')
+    if len(parts) != 3:
+        raise argparse.ArgumentTypeError(f"Expected station:baseline_year:comparison_year, got {text!r}")
+    station, baseline, comparison = parts
+    try:
+        return station, int(baseline), int(comparison)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Years must be integers in {text!r}")
+
+
+def report_filename(job):
+    station, baseline, comparison = job
+    return f"{station}_{baseline}_vs_{comparison}.html"
+
+
+# Every station x every other year of that station, compared against
+# compare_year (or the station's latest year when None)
+def all_jobs(files, compare_year=None):
+    years_by_station = {}
+    for station, year, _, _ in files:
+        years_by_station.setdefault(station, set()).add(year)
+    jobs = []
+    for station, years in sorted(years_by_station.items()):
+        comparison = compare_year if compare_year is not None else max(years)
+        if comparison not in years:
+            continue
+        jobs.extend((station, baseline, comparison) for baseline in sorted(years) if baseline != comparison)
+    return jobs
+
+
+# Hash of everything a report depends on: the size and mtime of every CSV of
+# its station (the calendar heatmap shows all of its years, not only the two
+# compared, and the climatology bands every year of their window), and the
+# build options, which include the climatology window, and the
+# WEBGL_POINT_THRESHOLD the workers will draw the daily lines with
+def job_signature(job, files, options):
+    from temperature_figures import webgl_point_threshold
+    station, baseline, comparison = job
+    sources = []
+    for file_station, year, month, path in files:
+        if file_station == station:
+            stat = os.stat(path)
+            sources.append([str(path), stat.st_mtime_ns, stat.st_size])
+    payload = json.dumps({'version': REPORT_VERSION, 'sources': sources, 'options': options,
+                          'webgl_threshold': webgl_point_threshold()}, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def read_manifest(out_dir):
+    try:
+        return json.loads((out_dir / MANIFEST_NAME).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(out_dir, manifest):
+    path = out_dir / MANIFEST_NAME
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+# --- Worker process ---
+# Each worker loads the dataset once (from the .npz cache when warm) and
+# builds all of its jobs from it
+
+_worker_dataset = None
+
+
+def _init_worker(data_dir):
+    global _worker_dataset
+    from temperature_dataset import TemperatureDataset
+    _worker_dataset = TemperatureDataset(data_dir).load()
+
+
+def _write_report(fig, path, compact):
+    tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    if compact:
+        from compact_export import write_compact_html
+        write_compact_html(fig, tmp_path, config=REPORT_CONFIG)
+    else:
+        import plotly.io as pio
+        pio.write_html(
+            fig,
+            str(tmp_path),
+            config=REPORT_CONFIG,
+            validate=not isinstance(fig, dict),
+            auto_open=False,
+            include_plotlyjs='cdn',
+            full_html=True,
+            include_mathjax='cdn'
+        )
+    os.replace(tmp_path, path)
+    return path.stat().st_size
+
+
+def build_report(job, out_dir, options):
+    if options['fast_figures']:
+        from fast_figures import combined_figure_dict as build_combined_figure
+    else:
+        from temperature_figures import build_combined_figure
+    station, baseline, comparison = job
+    start = time.perf_counter()
+    fig = build_combined_figure(
+        _worker_dataset, station, comparison, baseline,
+        max_points=options['max_points'],
+        downsample_method=options['downsample_method'],
+        precomputed_boxes=options['precomputed_boxes'],
+        consolidated_boxes=options['consolidated_boxes'],
+        baseline=options['climatology_baseline'],
+    )
+    size = _write_report(fig, Path(out_dir) / report_filename(job), options['compact'])
+    return size, time.perf_counter() - start
+
+
+# Build every job not already up to date in out_dir. Returns a summary dict
+# (built/skipped/failed counts, bytes written, timings)
+def run_batch(jobs, data_dir='.', out_dir='reports', max_workers=None, force=False, options=None, verbose=True):
+    options = dict({'max_points': None, 'downsample_method': 'lttb', 'precomputed_boxes': False,
+                    'consolidated_boxes': False, 'climatology_baseline': None, 'fast_figures': False, 'compact': False},
+                   **(options or {}))
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    files = discover_csv_files(data_dir)
+    available = {(station, year) for station, year, _, _ in files}
+    manifest = read_manifest(out_dir)
+    start = time.perf_counter()
+
+    pending, skipped, failed = [], 0, []
+    for job in dict.fromkeys(jobs):
+        station, baseline, comparison = job
+        missing = [year for year in (baseline, comparison) if (station, year) not in available]
+        if missing:
+            failed.append((job, f"no data for {station} {missing}"))
+            continue
+        signature = job_signature(job, files, options)
+        name = report_filename(job)
+        if not force and manifest.get(name) == signature and (out_dir / name).exists():
+            skipped += 1
+            continue
+        pending.append((job, signature))
+
+    built, bytes_written, build_seconds = 0, 0, 0.0
+    if pending:
+        max_workers = max_workers or load_workers_from_env() or os.cpu_count() or 1
+        max_workers = min(max_workers, len(pending))
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(str(data_dir),)) as pool:
+            futures = {pool.submit(build_report, job, str(out_dir), options): (job, signature)
+                       for job, signature in pending}
+            for future in as_completed(futures):
+                job, signature = futures[future]
+                try:
+                    size, seconds = future.result()
+                except Exception as exc:
+                    failed.append((job, f"{type(exc).__name__}: {exc}"))
+                    manifest.pop(report_filename(job), None)
+                    continue
+                built += 1
+                bytes_written += size
+                build_seconds += seconds
+                manifest[report_filename(job)] = signature
+                if verbose:
+                    print(f"  {report_filename(job)}  {size / 1024:.0f} KB  {seconds:.2f}s")
+        write_manifest(out_dir, manifest)
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        'jobs': len(dict.fromkeys(jobs)),
+        'built': built,
+        'skipped': skipped,
+        'failed': len(failed),
+        'bytes_written': bytes_written,
+        'elapsed_seconds': elapsed,
+        'build_seconds': build_seconds,
+        'reports_per_second': built / elapsed if elapsed > 0 else 0.0,
+    }
+    if verbose:
+        for job, reason in failed:
+            print(f"Failed {':'.join(map(str, job))}: {reason}", file=sys.stderr)
+        print(f"{summary['built']} built, {summary['skipped']} unchanged, {summary['failed']} failed "
+              f"in {elapsed:.2f}s ({summary['reports_per_second']:.1f} reports/s, "
+              f"{bytes_written / 1e6:.1f} MB written)")
+    return summary
+
+
+def main(argv=None):
+    from temperature_figures import parse_baseline
+    parser = argparse.ArgumentParser(description='Write one comparison report per station/baseline/comparison job.')
+    parser.add_argument('jobs', nargs='*', type=parse_job, help='station:baseline_year:comparison_year')
+    parser.add_argument('--all', action='store_true', help='every station against every other year of that station')
+    parser.add_argument('--compare-year', type=int, help='comparison year for --all (default: latest per station)')
+    parser.add_argument('--data-dir', default='.')
+    parser.add_argument('--out-dir', default='reports')
+    parser.add_argument('--workers', type=int, help='worker processes (default: LOAD_WORKERS or CPU count)')
+    parser.add_argument('--force', action='store_true', help='rebuild reports even if unchanged')
+    parser.add_argument('--compact', action='store_true', help='write reports with compact_export')
+    parser.add_argument('--max-points', type=int, help='downsample each daily line to this many points')
+    parser.add_argument('--downsample-method', default='lttb', choices=['lttb', 'minmax'])
+    parser.add_argument('--precomputed-boxes', action='store_true')
+    parser.add_argument('--consolidated-boxes', action='store_true')
+    parser.add_argument('--climatology-baseline', type=parse_baseline, metavar='START-END',
+                        help='draw the climatology bands of these years, e.g. 1991-2020')
+    parser.add_argument('--fast', action='store_true', help='build figures as dicts (fast_figures.py)')
+    args = parser.parse_args(argv)
+
+    jobs = list(args.jobs)
+    if args.all:
+        jobs += all_jobs(discover_csv_files(args.data_dir), args.compare_year)
+    if not jobs:
+        parser.error('no jobs given (pass station:baseline:comparison or --all)')
+    summary = run_batch(
+        jobs,
+        data_dir=args.data_dir,
+        out_dir=args.out_dir,
+        max_workers=args.workers,
+        force=args.force,
+        options={
+            'max_points': args.max_points,
+            'downsample_method': args.downsample_method,
+            'precomputed_boxes': args.precomputed_boxes,
+            'consolidated_boxes': args.consolidated_boxes,
+            'climatology_baseline': list(args.climatology_baseline) if args.climatology_baseline else None,
+            'fast_figures': args.fast,
+            'compact': args.compact,
+        },
+    )
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from temperature_data import CACHE_DIR_NAME, months
+
+# Usage:
+#   python benchmark.py --years 1 10 50 --stations 1 10 --out bench.json
+#   python benchmark.py --years 10 --compare bench.json
+# Synthetic data is written once per size under --data-dir (default: a
+# directory in the system temp dir) and reused by later runs.
+
+LAST_YEAR = 2024
+CSV_COLUMNS = ['Date', 'Max Temp', 'Min Temp', 'Avg Temp', 'Departure', 'HDD', 'CDD',
+               'Precipitation', 'New Snow', 'Snow Depth']
+
+
+# --- Synthetic data ---
+
+# One station-year of daily rows in the CSV schema: a seasonal cycle with
+# day-to-day noise and a small warming trend, reproducible from seed
+def synthetic_year(year, seed):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(f'{year}-01-01', f'{year}-12-31', freq='D')
+    season = -np.cos(2 * np.pi * (dates.dayofyear.to_numpy() - 15) / 365.25)
+    trend = 0.05 * (year - 1990)
+    max_temp = np.round(86 + 21 * season + trend + rng.normal(0, 4, len(dates)))
+    min_temp = np.round(max_temp - 24 + rng.normal(0, 3, len(dates)))
+    avg_temp = (max_temp + min_temp) / 2
+    return pd.DataFrame({
+        'Date': dates.strftime('%Y-%m-%d'),
+        'Max Temp': max_temp.astype(int),
+        'Min Temp': min_temp.astype(int),
+        'Avg Temp': avg_temp,
+        'Departure': np.round(rng.normal(0, 3, len(dates)), 1),
+        'HDD': np.maximum(65 - avg_temp, 0).astype(int),
+        'CDD': np.maximum(avg_temp - 65, 0).astype(int),
+        'Precipitation': np.round(rng.exponential(0.02, len(dates)), 2),
+        'New Snow': 0.0,
+        'Snow Depth': 0,
+    }, columns=CSV_COLUMNS)
+
+
+# Write n_stations x n_years of monthly CSVs under data_dir (the first
+# station at the top level, as DEFAULT_STATION, the rest in subdirectories).
+# Existing directories with a completion marker are reused.
+def generate_dataset(data_dir, n_years, n_stations):
+    root = Path(data_dir) / f'{n_stations}st_{n_years}y'
+    marker = root / '.complete'
+    if marker.exists():
+        return root
+    for s in range(n_stations):
+        station_dir = root if s == 0 else root / f'station_{s:03d}'
+        station_dir.mkdir(parents=True, exist_ok=True)
+        for year in range(LAST_YEAR - n_years + 1, LAST_YEAR + 1):
+            frame = synthetic_year(year, seed=s * 10000 + year)
+            month_numbers = pd.to_datetime(frame['Date']).dt.month.to_numpy()
+            for m, month in enumerate(months, start=1):
+                frame[month_numbers == m].to_csv(
+                    station_dir / f'{month}_{year}_temperature_data.csv', index=False)
+    marker.touch()
+    return root
+
+
+# --- Timing ---
+
+# Run fn repeat times untraced for timing, then once more under tracemalloc
+# for memory; setup (untimed) runs before each call. Returns (last result,
+# {'seconds': best wall time, 'peak_mb': peak traced memory of one call})
+def measure(fn, repeat=1, setup=None):
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {'seconds': best, 'peak_mb': peak / 1e6}
+
+
+# Peak resident memory of this process so far (None where unavailable)
+def max_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / 1e6 if sys.platform == 'darwin' else rss / 1e3
+
+
+# Time every stage of the build pipeline on the data in data_dir:
+# discover, load (cold .npz cache and warm), aggregate, traces, figure,
+# serialize and HTML export
+def run_pipeline(data_dir, repeat=1, max_points=None):
+    import plotly.io as pio
+    from temperature_dataset import TemperatureDataset, discover_csv_files
+    from temperature_figures import (
+        box_traces, build_combined_figure, highlight_traces, line_traces,
+    )
+    from temperature_stats import monthly_aggregates
+
+    stages = {}
+    files, stages['discover'] = measure(lambda: discover_csv_files(data_dir), repeat)
+
+    # Cold load: parse every CSV (the .npz cache is cleared before each run)
+    def clear_cache():
+        for cache_dir in [Path(data_dir) / CACHE_DIR_NAME] + list(Path(data_dir).glob(f'*/{CACHE_DIR_NAME}')):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    _, stages['load_cold'] = measure(lambda: TemperatureDataset(data_dir).load(), repeat, setup=clear_cache)
+    dataset, stages['load_warm'] = measure(lambda: TemperatureDataset(data_dir).load(), repeat)
+
+    _, stages['aggregate'] = measure(lambda: monthly_aggregates(dataset.data), repeat)
+    dataset.monthly_aggregates()
+
+    station = dataset.default_station
+    years = dataset.years(station)
+    current_year, historical_year = years[-1], years[0]
+    args = (dataset, station, current_year, historical_year)
+    _, stages['traces'] = measure(lambda: (
+        line_traces(*args, max_points=max_points),
+        box_traces(*args, visible=False),
+        highlight_traces(*args, visible=False),
+    ), repeat)
+    fig, stages['figure'] = measure(lambda: build_combined_figure(*args, max_points=max_points), repeat)
+    payload, stages['serialize'] = measure(lambda: pio.to_json(fig), repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        html_path = Path(tmp) / 'report.html'
+        _, stages['export_html'] = measure(lambda: pio.write_html(
+            fig, str(html_path), include_plotlyjs='cdn', full_html=True, auto_open=False), repeat)
+        html_bytes = html_path.stat().st_size
+
+    return {
+        'files': len(files),
+        'rows': len(dataset.data),
+        'traces': len(fig.data),
+        'stages': stages,
+        'total_seconds': sum(stage['seconds'] for stage in stages.values()),
+        'payload_bytes': len(payload.encode('utf-8')),
+        'html_bytes': html_bytes,
+    }
+
+
+def environment_info():
+    import plotly
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plotly': plotly.__version__,
+    }
+
+
+# run_pipeline in a fresh interpreter, so that its max_rss_mb is the peak of
+# this configuration alone rather than of every run before it (ru_maxrss
+# never goes down within a process)
+def run_pipeline_isolated(data_dir, repeat=1, max_points=None):
+    command = [sys.executable, str(Path(__file__).resolve()), '--pipeline', str(data_dir), '--repeat', str(repeat)]
+    if max_points is not None:
+        command += ['--max-points', str(max_points)]
+    completed = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run_benchmarks(year_sizes, station_counts, data_dir, repeat=1, max_points=None, verbose=True):
+    results = {'environment': environment_info(), 'runs': []}
+    for n_stations in station_counts:
+        for n_years in year_sizes:
+            root = generate_dataset(data_dir, n_years, n_stations)
+            run = {'years': n_years, 'stations': n_stations, 'max_points': max_points}
+            run.update(run_pipeline_isolated(root, repeat=repeat, max_points=max_points))
+            results['runs'].append(run)
+            if verbose:
+                print_run(run)
+    return results
+
+
+def print_run(run):
+    print(f"{run['stations']} station(s) x {run['years']} year(s): {run['rows']} rows, "
+          f"{run['files']} files, {run['traces']} traces")
+    for name, stage in run['stages'].items():
+        print(f"  {name:<12} {stage['seconds'] * 1000:9.1f} ms  {stage['peak_mb']:8.1f} MB peak")
+    print(f"  payload {run['payload_bytes'] / 1e6:.2f} MB, html {run['html_bytes'] / 1e6:.2f} MB")
+    if run.get('max_rss_mb') is not None:
+        print(f"  peak RSS of the run's process {run['max_rss_mb']:.1f} MB")
+
+
+# Stage-by-stage ratios of new against old results for the sizes both contain
+def compare_results(old, new):
+    old_runs = {(run['stations'], run['years']): run for run in old['runs']}
+    for run in new['runs']:
+        before = old_runs.get((run['stations'], run['years']))
+        if before is None:
+            continue
+        print(f"{run['stations']} station(s) x {run['years']} year(s) vs {old['environment'].get('commit')}:")
+        for name, stage in run['stages'].items():
+            if name in before['stages'] and before['stages'][name]['seconds'] > 0:
+                ratio = stage['seconds'] / before['stages'][name]['seconds']
+                print(f"  {name:<12} {ratio:6.2f}x")
+        print(f"  payload      {run['payload_bytes'] / max(before['payload_bytes'], 1):6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time each stage of the visualization build on synthetic data.')
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 10, 50, 100])
+    parser.add_argument('--stations', type=int, nargs='+', default=[1])
+    parser.add_argument('--data-dir', default=str(Path(tempfile.gettempdir()) / 'temperature_benchmark'))
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage; the fastest is reported')
+    parser.add_argument('--max-points', type=int, help='line point budget, as LINE_POINT_BUDGET')
+    parser.add_argument('--out', help='write results to this JSON file')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    # Internal: one configuration, printed as JSON (see run_pipeline_isolated)
+    parser.add_argument('--pipeline', metavar='DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.pipeline:
+        run = run_pipeline(args.pipeline, repeat=args.repeat, max_points=args.max_points)
+        run['max_rss_mb'] = max_rss_mb()
+        print(json.dumps(run))
+        return
+
+    results = run_benchmarks(args.years, args.stations, args.data_dir, repeat=args.repeat,
+                             max_points=args.max_points)
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding='utf-8')
+        print(f"Results saved to {args.out}")
+    if args.compare:
+        compare_results(json.loads(Path(args.compare).read_text(encoding='utf-8')), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import base64
+import datetime
+import gzip
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+from plotly.io.json import to_json_plotly
+from plotly.offline import get_plotlyjs_version
+
+# Arrays shorter than this stay inline as plain JSON
+MIN_ENCODED_LENGTH = 8
+
+MS_PER_DAY = 86400000
+
+
+def _b64(values):
+    return base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii')
+
+
+# Smallest integer typed array (plotly.js dtype name) that holds values
+def _int_spec(values):
+    for dtype, name in [(np.uint8, 'u1'), (np.int16, 'i2'), (np.int32, 'i4')]:
+        info = np.iinfo(dtype)
+        if values.size == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(dtype), name
+    return values.astype(np.float64), 'f8'
+
+
+# Encode one trace array for the payload's shared array table, or return
+# None to leave it inline. Kinds:
+#   numeric  - plotly.js typed-array spec ({dtype, bdata, shape}), float32
+#              when that loses nothing visible (1e-6 relative), else float64
+#   date     - whole days (or ms) since the epoch, expanded to date strings
+#              in the browser
+#   category - repeated strings as a table of unique values plus codes
+def _encode_array(values):
+    if isinstance(values, (list, tuple)):
+        if len(values) < MIN_ENCODED_LENGTH:
+            return None
+        if all(isinstance(v, str) for v in values):
+            values = np.array(values, dtype=object)
+        else:
+            try:
+                values = np.asarray(values)
+            except ValueError:
+                return None
+    if not isinstance(values, np.ndarray):
+        values = np.asarray(values)
+    if len(values) < MIN_ENCODED_LENGTH or values.ndim > 2:
+        return None
+
+    kind = values.dtype.kind
+    if kind == 'M':
+        ms = values.astype('datetime64[ms]').astype(np.int64)
+        if values.ndim == 1 and np.all(ms % MS_PER_DAY == 0):
+            codes, dtype = _int_spec(ms // MS_PER_DAY)
+            return {'kind': 'date', 'unit': MS_PER_DAY, 'dtype': dtype, 'bdata': _b64(codes)}
+        return {'kind': 'date', 'unit': 1, 'dtype': 'f8', 'bdata': _b64(ms.astype(np.float64))}
+    if kind in 'iuf':
+        if kind == 'f':
+            as_f4 = values.astype(np.float32)
+            if np.allclose(as_f4, values, rtol=1e-6, atol=0, equal_nan=True):
+                encoded, dtype = as_f4, 'f4'
+            else:
+                encoded, dtype = values.astype(np.float64), 'f8'
+        else:
+            encoded, dtype = _int_spec(values.astype(np.int64))
+        spec = {'kind': 'numeric', 'dtype': dtype, 'bdata': _b64(encoded)}
+        if values.ndim == 2:
+            spec["shape"] = f"{values.shape[0]}, {values.shape[1]}"
+        return spec
+    if kind in 'OU' and values.ndim == 1 and all(isinstance(v, str) for v in values):
+        uniques, codes = np.unique(values.astype(str), return_inverse=True)
+        if len(uniques) == len(values):
+            return {'kind': 'strings', 'values': values.astype(str).tolist()}
+        codes, dtype = _int_spec(codes.astype(np.int64))
+        return {'kind': 'category', 'values': uniques.tolist(), 'dtype': dtype, 'bdata': _b64(codes)}
+    return None
+
+
+# numpy array of a plotly.js typed array {'dtype', 'bdata', 'shape'} (what
+# plotly writes numeric arrays as), so it can be narrowed and interned too
+def _typed_array_values(spec):
+    values = np.frombuffer(base64.b64decode(spec['bdata']), dtype=np.dtype(spec['dtype']))
+    if 'shape' in spec:
+        values = values.reshape([int(size) for size in str(spec['shape']).split(',')])
+    return values
+
+
+def _is_typed_array(obj):
+    return isinstance(obj, dict) and 'bdata' in obj and 'dtype' in obj and set(obj) <= {'dtype', 'bdata', 'shape'}
+
+
+# Replace every encodable array in the trace dicts by {"$ref": n}, storing
+# each distinct array once in the returned table (the three line traces of
+# a year share one date axis, for example)
+def compact_figure_payload(fig):
+    fig_dict = fig if isinstance(fig, dict) else fig.to_plotly_json()
+    arrays = []
+    seen = {}
+
+    def intern(spec):
+        digest = hashlib.sha1(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+        if digest not in seen:
+            seen[digest] = len(arrays)
+            arrays.append(spec)
+        return {'$ref': seen[digest]}
+
+    def compact(obj):
+        if _is_typed_array(obj):
+            spec = _encode_array(_typed_array_values(obj))
+            return intern(spec) if spec is not None else obj
+        if isinstance(obj, dict):
+            return {key: compact(value) for key, value in obj.items()}
+        if isinstance(obj, (pd.Series, pd.Index)):
+            obj = obj.to_numpy()
+        if isinstance(obj, (list, tuple)) or (isinstance(obj, np.ndarray) and obj.ndim > 0):
+            spec = _encode_array(obj)
+            if spec is not None:
+                return intern(spec)
+            return [compact(value) for value in obj] if isinstance(obj, (list, tuple)) else obj
+        # Date scalars (shape bounds, for example) as ISO strings
+        if isinstance(obj, (datetime.date, np.datetime64)):
+            return pd.Timestamp(obj).isoformat()
+        return obj
+
+    return {
+        'data': [compact(trace) for trace in fig_dict['data']],
+        'layout': fig_dict['layout'],
+        'arrays': arrays,
+    }
+
+
+_DECODER_JS = """
+(async function () {
+  var payloadText = document.getElementById('figure-payload').textContent;
+  var payload;
+  if (%(gzipped)s) {
+    var bytes = Uint8Array.from(atob(payloadText.trim()), function (c) { return c.charCodeAt(0); });
+    var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+    payload = JSON.parse(await new Response(stream).text());
+  } else {
+    payload = JSON.parse(payloadText);
+  }
+  var typed = {u1: Uint8Array, i2: Int16Array, i4: Int32Array, f4: Float32Array, f8: Float64Array};
+  function unpack(spec) {
+    var bin = atob(spec.bdata), buf = new Uint8Array(bin.length);
+    for (var i = 0; i < bin.length; i++) { buf[i] = bin.charCodeAt(i); }
+    return new typed[spec.dtype](buf.buffer);
+  }
+  var decoded = payload.arrays.map(function (spec) {
+    if (spec.kind === 'numeric') {
+      var out = {dtype: spec.dtype, bdata: spec.bdata};
+      if (spec.shape) { out.shape = spec.shape; }
+      return out;
+    }
+    if (spec.kind === 'date') {
+      var width = spec.unit === %(ms_per_day)d ? 10 : 23;
+      return Array.from(unpack(spec), function (v) {
+        return new Date(v * spec.unit).toISOString().slice(0, width).replace('T', ' ');
+      });
+    }
+    if (spec.kind === 'category') {
+      return Array.from(unpack(spec), function (code) { return spec.values[code]; });
+    }
+    return spec.values;
+  });
+  function resolve(obj) {
+    if (Array.isArray(obj)) { return obj.map(resolve); }
+    if (obj && typeof obj === 'object') {
+      if (Object.keys(obj).length === 1 && '$ref' in obj) {
+        var value = decoded[obj['$ref']];
+        return Array.isArray(value) ? value.slice() : Object.assign({}, value);
+      }
+      var out = {};
+      for (var key in obj) { out[key] = resolve(obj[key]); }
+      return out;
+    }
+    return obj;
+  }
+  Plotly.newPlot('figure', resolve(payload.data), payload.layout, %(config)s);
+})();
+"""
+
+_HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8" />
+<script src="https://cdn.plot.ly/plotly-%(plotly_version)s.min.js" charset="utf-8"></script>
+</head>
+<body style="margin:0">
+<div id="figure" style="width:100%%;height:100vh;"></div>
+<script id="figure-payload" type="%(payload_type)s">%(payload)s</script>
+<script>%(decoder)s</script>
+</body>
+</html>
+"""
+
+
+# Write fig as a standalone HTML page whose data is stored as a table of
+# deduplicated typed arrays (see compact_figure_payload); gzip_payload=True also
+# compresses that payload (decompressed in the browser with
+# DecompressionStream). Returns the number of bytes written.
+def write_compact_html(fig, path, config=None, gzip_payload=False):
+    payload = to_json_plotly(compact_figure_payload(fig))
+    if gzip_payload:
+        payload = base64.b64encode(gzip.compress(payload.encode('utf-8'), mtime=0)).decode('ascii')
+        payload_type = 'application/gzip+base64'
+    else:
+        payload = payload.replace('</', '<\\/')
+        payload_type = 'application/json'
+    html = _HTML_TEMPLATE % {
+        'plotly_version': get_plotlyjs_version(),
+        'payload_type': payload_type,
+        'payload': payload,
+        'decoder': _DECODER_JS % {
+            'gzipped': 'true' if gzip_payload else 'false',
+            'ms_per_day': MS_PER_DAY,
+            'config': json.dumps(config or {}),
+        },
+    }
+    data = html.encode('utf-8')
+    with open(path, 'wb') as fh:
+        fh.write(data)
+    return len(data)
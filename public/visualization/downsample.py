@@ -0,0 +1,79 @@
+import numpy as np
+
+
+# Largest-Triangle-Three-Buckets: pick n_out of the points (x, y) that keep
+# the visual shape of the line. Always keeps the first and last point.
+# Returns sorted indices into the inputs. x must be increasing and numeric
+# (datetimes can be passed as int64 nanoseconds).
+def lttb_indices(x, y, n_out):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    n_out = max(n_out, 3)
+
+    # Interior points split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for b in range(n_out - 2):
+        start, stop = edges[b], edges[b + 1]
+        # The third triangle vertex is the mean of the next bucket
+        if b + 2 < len(edges):
+            next_start, next_stop = edges[b + 1], edges[b + 2]
+            avg_x = x[next_start:next_stop].mean()
+            avg_y = y[next_start:next_stop].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs(
+            (x[prev] - avg_x) * (y[start:stop] - y[prev])
+            - (x[prev] - x[start:stop]) * (avg_y - y[prev])
+        )
+        prev = start + int(np.argmax(area))
+        selected[b + 1] = prev
+    return selected
+
+
+# Min/max bucketing: split the series into n_out // 2 buckets and keep the
+# lowest and highest point of each, so no extreme value is ever dropped.
+# Returns sorted indices into y.
+def minmax_indices(y, n_out):
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    n_buckets = max(n_out // 2, 1)
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    picks = []
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop <= start:
+            continue
+        bucket = y[start:stop]
+        picks.append(start + int(np.argmin(bucket)))
+        picks.append(start + int(np.argmax(bucket)))
+    return np.unique(picks)
+
+
+DOWNSAMPLE_METHODS = {
+    'lttb': lambda x, y, n_out: lttb_indices(x, y, n_out),
+    'minmax': lambda x, y, n_out: minmax_indices(y, n_out),
+}
+
+
+# Indices of at most max_points of a daily series (all indices when it is
+# already small enough; missing values are skipped otherwise). x may be a
+# datetime Series/array; method is 'lttb' or 'minmax'.
+def downsample_indices(x, y, max_points, method='lttb'):
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method {method!r}; expected one of {sorted(DOWNSAMPLE_METHODS)}")
+    x = np.asarray(x)
+    if x.dtype.kind == 'M':
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    y = np.asarray(y, dtype=np.float64)
+    if max_points is None or len(y) <= max_points:
+        return np.arange(len(y))
+    valid = np.flatnonzero(~np.isnan(y))
+    return valid[DOWNSAMPLE_METHODS[method](x[valid], y[valid], max_points)]
@@ -0,0 +1,142 @@
+import base64
+import threading
+
+import numpy as np
+
+from instrumentation import stage
+from temperature_figures import combined_figure_specs, graph_object_trace, view_figure_specs
+
+# Figures assembled as plain dicts straight from the temperature_figures
+# trace specs, without constructing graph_objects: plotly validates every
+# property and deep-copies every trace on add_trace, which dominates the
+# build time of batch runs. Each distinct trace/layout shape (type plus the
+# set of property paths) is still validated once through graph_objects, so a
+# misspelled property fails as loudly as before. The result is the same
+# figure as the graph_objects path: fig.to_plotly_json() of
+# build_combined_figure / build_view_figure, and figure_json(...) parses to
+# the same JSON as plotly.io.to_json(...) (only the key order differs).
+
+_checked_shapes = set()
+_checked_lock = threading.Lock()
+_template = None
+
+
+def _property_paths(obj, prefix=''):
+    paths = []
+    for key, value in obj.items():
+        if isinstance(value, dict):
+            paths += _property_paths(value, f'{prefix}{key}.')
+        else:
+            paths.append(f'{prefix}{key}')
+    return paths
+
+
+def _check_once(kind, props, validate):
+    signature = (kind, props.get('type'), frozenset(_property_paths(props)))
+    if signature in _checked_shapes:
+        return
+    validate(props)  # raises ValueError on an unknown or invalid property
+    with _checked_lock:
+        _checked_shapes.add(signature)
+
+
+def _validate_layout(layout):
+    import plotly.graph_objects as go
+    go.Layout(layout)
+
+
+# Drop properties set to None (unset in graph_objects) and copy the dicts
+# so the specs are not modified by the base64 conversion
+def _pruned(obj):
+    if isinstance(obj, dict):
+        return {key: _pruned(value) for key, value in obj.items() if value is not None}
+    if isinstance(obj, list):
+        return [_pruned(value) if isinstance(value, (dict, list)) else value for value in obj]
+    return obj
+
+
+# Layout template graph_objects figures get by default, as a dict (built once)
+def default_template():
+    global _template
+    if _template is None:
+        import plotly.io as pio
+        _template = pio.templates[pio.templates.default].to_plotly_json()
+    return _template
+
+
+# plotly.js typed array names of the numpy dtypes it decodes
+_TYPED_ARRAY_DTYPES = {
+    'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+    'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8',
+}
+
+
+# A numeric array as a plotly.js typed array {'dtype', 'bdata'} ('shape' for
+# 2-d), int64 narrowed to the smallest integer type holding it; anything
+# else is returned as is and serialized as a list
+def _typed_array(values):
+    if values.dtype == np.int64 and values.size:
+        for dtype in (np.int8, np.int16, np.int32):
+            limits = np.iinfo(dtype)
+            if limits.min <= values.min() and values.max() <= limits.max:
+                values = values.astype(dtype)
+                break
+    name = _TYPED_ARRAY_DTYPES.get(str(values.dtype))
+    if name is None or values.size == 0:
+        return values
+    array = {'dtype': name, 'bdata': base64.b64encode(np.ascontiguousarray(values)).decode('ascii')}
+    if values.ndim > 1:
+        array['shape'] = ', '.join(str(size) for size in values.shape)
+    return array
+
+
+# Replace the numpy arrays in obj by typed arrays in place, as Figure.to_dict()
+# does (axis ranges stay plain lists)
+def _encode_arrays(obj):
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if isinstance(value, np.ndarray):
+                if key != 'range':
+                    obj[key] = _typed_array(value)
+            else:
+                _encode_arrays(value)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            _encode_arrays(value)
+
+
+# Figure dict {'data', 'layout'} from trace specs and a layout dict, with
+# numeric arrays converted to plotly.js typed arrays
+def figure_dict(specs, layout):
+    with stage('figure_dict'):
+        data = [_pruned(spec) for spec in specs]
+        layout = _pruned(layout)
+        for trace in data:
+            _check_once('trace', trace, graph_object_trace)
+        _check_once('layout', layout, _validate_layout)
+        fig = {'data': data, 'layout': dict(layout, template=default_template())}
+        _encode_arrays(fig)
+        return fig
+
+
+# build_combined_figure() as a figure dict
+def combined_figure_dict(dataset, station, current_year, historical_year, **options):
+    entries, layout = combined_figure_specs(dataset, station, current_year, historical_year, **options)
+    return figure_dict([spec for spec, _ in entries], layout)
+
+
+# build_view_figure() as a figure dict
+def view_figure_dict(view, dataset, station, current_year, historical_year, **options):
+    entries, layout = view_figure_specs(view, dataset, station, current_year, historical_year, **options)
+    return figure_dict([spec for spec, _ in entries], layout)
+
+
+# --- Serialization ---
+
+# JSON text of a figure dict (or graph_objects figure) through plotly's own
+# encoder (orjson when installed), so dates, NaN and HTML escaping come out
+# as plotly.io.to_json writes them
+def figure_json(fig):
+    from plotly.io.json import to_json_plotly
+    with stage('serialize'):
+        return to_json_plotly(fig)
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+# Cache key for a figure: the dataset fingerprint plus whatever selects the
+# figure (view, station, years, stat, ...). Parameters must be JSON-serializable.
+def figure_cache_key(fingerprint, **params):
+    payload = json.dumps({'data': fingerprint, **params}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class FigureCache:
+    # Built figures kept in an in-memory LRU of at most max_entries figures,
+    # optionally backed by a directory of JSON files (at most max_disk_entries,
+    # oldest evicted first) so a restarted process can skip rebuilding. With
+    # figure_dicts the figures are plain dicts (FAST_FIGURES) and disk entries
+    # are read back as dicts too, without going through graph_objects.
+
+    def __init__(self, max_entries=32, disk_dir=None, max_disk_entries=256, figure_dicts=False):
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_entries = max_disk_entries
+        self.figure_dicts = figure_dicts
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        fig = self._read_disk(key)
+        if fig is None:
+            fig = build()
+            self._write_disk(key, fig)
+            with self._lock:
+                self.misses += 1
+        else:
+            with self._lock:
+                self.disk_hits += 1
+        self._store(key, fig)
+        return fig
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _store(self, key, fig):
+        with self._lock:
+            self._entries[key] = fig
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _disk_path(self, key):
+        return self.disk_dir / f"{key}.json"
+
+    def _read_disk(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            text = path.read_text(encoding='utf-8')
+            if self.figure_dicts:
+                fig = json.loads(text)
+            else:
+                import plotly.io as pio
+                fig = pio.from_json(text)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)  # mark as recently used for disk eviction
+        return fig
+
+    def _write_disk(self, key, fig):
+        if self.disk_dir is None:
+            return
+        import plotly.io as pio
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            path = self._disk_path(key)
+            tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+            if isinstance(fig, dict):
+                from fast_figures import figure_json  # FAST_FIGURES dicts, validated when built
+                text = figure_json(fig)
+            else:
+                text = pio.to_json(fig)
+            tmp_path.write_text(text, encoding='utf-8')
+            os.replace(tmp_path, path)
+            stored = sorted(self.disk_dir.glob('*.json'), key=lambda p: p.stat().st_mtime)
+            for old in stored[:max(0, len(stored) - self.max_disk_entries)]:
+                old.unlink(missing_ok=True)
+        except OSError:
+            # Disk store is best effort; the in-memory entry is still kept
+            pass
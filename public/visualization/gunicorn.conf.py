@@ -0,0 +1,16 @@
+# gunicorn settings for `gunicorn --config gunicorn.conf.py wsgi:server`
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8051')}"
+
+# WEB_CONCURRENCY worker processes (default: one per CPU, at most 8) with
+# WEB_THREADS threads each
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 8)))
+threads = int(os.environ.get('WEB_THREADS', 4))
+
+# Import wsgi.py (load the CSVs, build the figures) once in the master;
+# workers are forked from it and share that memory copy-on-write
+preload_app = True
+
+timeout = 120
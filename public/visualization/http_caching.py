@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Response bodies worth compressing (the layout and callback JSON, HTML,
+# scripts and styles); images are already compressed
+COMPRESSIBLE_TYPES = (
+    'application/json', 'text/html', 'text/css', 'text/plain',
+    'application/javascript', 'text/javascript', 'image/svg+xml',
+)
+MIN_COMPRESS_BYTES = 500
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Assets requested with a ?v= version (see asset_url) never change
+IMMUTABLE_MAX_AGE = 31536000
+ASSET_MAX_AGE = int(os.environ.get('ASSET_MAX_AGE', 3600))
+
+ASSETS_DIR = Path(__file__).parent / 'assets'
+
+
+# Strong ETag of the initial Dash layout: it only changes when the data
+# (dataset fingerprint), the settings that shape the figure or the assets
+# it links to (their asset_url versions) change
+def layout_etag(fingerprint, settings):
+    payload = json.dumps({'data': fingerprint, 'settings': settings, 'assets': asset_versions()},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:32]
+
+
+# {name: version} of the files in the assets folder, the ?v= values
+# asset_url puts in the layout
+def asset_versions():
+    if not ASSETS_DIR.is_dir():
+        return {}
+    return {path.relative_to(ASSETS_DIR).as_posix(): path.stat().st_mtime_ns
+            for path in ASSETS_DIR.rglob('*') if path.is_file()}
+
+
+# URL of a file in the assets folder, versioned by its modification time so
+# it can be cached for a year and still refresh when the file is replaced
+def asset_url(name):
+    path = ASSETS_DIR / name
+    if path.exists():
+        return f'/assets/{name}?v={path.stat().st_mtime_ns}'
+    return f'/assets/{name}'
+
+
+# --- Header image variants ---
+HEADER_VARIANT_FORMATS = [('avif', 'AVIF', 'image/avif'), ('webp', 'WEBP', 'image/webp')]
+
+
+# Write scaled-down AVIF/WebP copies of an image next to it (skipped when up
+# to date; formats Pillow can't write are left out). Returns [(file name,
+# mime type)] of the variants available, best first; empty without Pillow.
+def prepare_image_variants(source, width=1600, quality=70):
+    source = Path(source)
+    if not source.exists():
+        return []
+    try:
+        from PIL import Image
+    except ImportError:
+        return []
+    variants = []
+    for suffix, pil_format, mime in HEADER_VARIANT_FORMATS:
+        target = source.with_name(f'{source.stem}-{width}.{suffix}')
+        if not target.exists() or target.stat().st_mtime < source.stat().st_mtime:
+            try:
+                with Image.open(source) as image:
+                    if image.width > width:
+                        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+                    image.save(target, format=pil_format, quality=quality)
+            except (KeyError, OSError, ValueError):
+                # This Pillow build can't encode the format
+                target.unlink(missing_ok=True)
+                continue
+        variants.append((target.name, mime))
+    return variants
+
+
+# --- Compression ---
+
+# Preferred encoding the client accepts: 'br' (when brotli is installed),
+# 'gzip' or None
+def choose_encoding(accept_encoding):
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        token, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.lower()] = q
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressedBodies:
+    # Small LRU of compressed bodies keyed by (ETag, encoding), so the layout
+    # and static bundles are compressed once per process
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, key, data, encoding):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        body = compress_body(data, encoding)
+        with self._lock:
+            self._entries[key] = body
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body
+
+
+# Add to app's Flask server:
+#   - a strong ETag on /_dash-layout (etag, see layout_etag) with a 304
+#     answered before Dash serializes the layout again
+#   - Cache-Control for /assets/ (a year, immutable, when versioned)
+#   - gzip/brotli compression of text responses (compress=True)
+def install_http_caching(app, etag, compress=True):
+    from flask import request
+
+    server = app.server
+    prefix = app.config.routes_pathname_prefix
+    layout_path = prefix + '_dash-layout'
+    assets_prefix = prefix + app.config.assets_url_path.strip('/') + '/'
+    bodies = CompressedBodies()
+
+    @server.before_request
+    def layout_not_modified():
+        if request.path != layout_path or not request.if_none_match.contains(etag):
+            return None
+        response = server.response_class(status=304)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.set_etag(etag)
+        return response
+
+    @server.after_request
+    def cache_and_compress(response):
+        if request.path == layout_path and response.status_code == 200:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+        elif request.path.startswith(assets_prefix) and response.status_code in (200, 304):
+            if 'v' in request.args:
+                response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+            else:
+                response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}'
+        if compress:
+            response = _compress_response(response, bodies)
+        return response
+
+    return server
+
+
+def _compress_response(response, bodies):
+    from flask import request
+
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    response.direct_passthrough = False
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+    # The ETag is kept as is for every encoding (Vary: Accept-Encoding tells
+    # caches apart), so revalidations match it whichever encoding was sent
+    etag, _ = response.get_etag()
+    if etag:
+        body = bodies.get_or_compress((etag, encoding), data, encoding)
+    else:
+        body = compress_body(data, encoding)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
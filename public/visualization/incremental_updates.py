@@ -0,0 +1,235 @@
+import threading
+import time
+
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+
+from temperature_figures import (
+    DEFAULT_VIEW, VIEWS, add_month_shading, box_months, box_traces, calendar_heatmap_traces,
+    climatology_band_traces,
+    combined_figure_with_registry, consolidated_box_traces, highlight_traces,
+    line_traces, month_shading_traces,
+)
+
+# Which view is showing is client state (updatemenus buttons), so updates
+# never send trace visibility
+CLIENT_PROPS = {'visible', 'uid'}
+
+
+# Properties of new that differ from old, as plotly JSON values
+def _changed_props(old, new):
+    old_json = old.to_plotly_json()
+    new_json = new.to_plotly_json()
+    changed = {}
+    for key in set(old_json) | set(new_json):
+        if key in CLIENT_PROPS:
+            continue
+        if to_json_plotly(old_json.get(key)) != to_json_plotly(new_json.get(key)):
+            changed[key] = new_json.get(key)
+    return changed
+
+
+class FigureUpdater:
+    # Keeps the combined figure of one comparison in step with the CSVs on
+    # disk. poll() reloads only new/changed files (TemperatureDataset.refresh)
+    # and rebuilds only the traces of the affected years and months (plus the
+    # calendar heatmaps and climatology bands, which span other years); each
+    # change is recorded as a list of operations so clients holding an older
+    # copy of the figure can be brought up to date with a dash.Patch
+    # (see ops_to_patch) instead of being sent the whole figure again.
+    # Operations are (kind, target, value) tuples:
+    #   ('update', i, props)      set trace i's properties
+    #   ('insert', i, trace)      insert a trace before index i
+    #   ('remove', i, None)       delete trace i
+    #   ('layout', path, value)   set a layout property by key path
+    # Versions are TemperatureDataset.state_version() hashes, so separate
+    # worker processes name the same data the same way; a client whose
+    # version is not in this process's history gets the whole figure.
+    # With patch_figure=False no figure is kept and poll() only refreshes
+    # the dataset and moves to the new version. With consolidated_boxes=True the
+    # trace count is fixed, so changes are only ever 'update' operations.
+
+    def __init__(self, dataset, station, current_year, historical_year,
+                 max_points=None, downsample_method='lttb', precomputed_boxes=False,
+                 consolidated_boxes=False, baseline=None, patch_figure=True, min_interval=0.0,
+                 max_versions=32):
+        self.dataset = dataset
+        self.station = station
+        self.current_year = current_year
+        self.historical_year = historical_year
+        self.max_points = max_points
+        self.downsample_method = downsample_method
+        self.precomputed_boxes = precomputed_boxes
+        self.consolidated_boxes = consolidated_boxes
+        self.baseline = baseline
+        self.min_interval = min_interval
+        self.max_versions = max_versions
+        self.version = dataset.state_version(station)
+        self.fig = self.registry = None
+        if patch_figure:
+            self.fig, self.registry = combined_figure_with_registry(
+                dataset, station, current_year, historical_year,
+                max_points=max_points, downsample_method=downsample_method,
+                precomputed_boxes=precomputed_boxes, consolidated_boxes=consolidated_boxes,
+                baseline=baseline)
+        # (version before, version after, ops) per applied change
+        self._history = []
+        self._last_poll = None
+        self._lock = threading.Lock()
+
+    # Check the data directory (at most once per min_interval seconds) and
+    # apply any change. Returns the affected (year, month) pairs of the
+    # station, empty when the figure is unchanged.
+    def poll(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._last_poll is not None and now - self._last_poll < self.min_interval:
+                return []
+            self._last_poll = now
+            changed = self.dataset.refresh()
+            affected = sorted({(year, month) for station, year, month in changed if station == self.station})
+            if not affected:
+                return []
+            ops = self._apply(affected) if self.fig is not None else []
+            previous, self.version = self.version, self.dataset.state_version(self.station)
+            self._history.append((previous, self.version, ops))
+            del self._history[:-self.max_versions]
+            return affected
+
+    # (ops, version): the operations that bring a figure at version up to the
+    # current version, or None when version is not in the kept history (too
+    # old, or from another worker process that saw other changes; the client
+    # then needs the whole figure, see snapshot)
+    def updates_since(self, version):
+        with self._lock:
+            if version == self.version:
+                return [], self.version
+            for start in range(len(self._history) - 1, -1, -1):
+                if self._history[start][0] == version:
+                    return [op for _, _, ops in self._history[start:] for op in ops], self.version
+            return None, self.version
+
+    # (copy of the current figure, version)
+    def snapshot(self):
+        with self._lock:
+            return go.Figure(self.fig), self.version
+
+    def _apply(self, affected):
+        args = (self.dataset, self.station, self.current_year, self.historical_year)
+        ops = self._replace(calendar_heatmap_traces(*args))
+        if self.baseline is not None:
+            ops += self._replace(climatology_band_traces(*args, self.baseline))
+        affected = [(year, month) for year, month in affected if year in (self.current_year, self.historical_year)]
+        if not affected:
+            return ops
+        years = {year for year, _ in affected}
+        ops += self._replace([
+            entry for entry in line_traces(*args, max_points=self.max_points,
+                                           downsample_method=self.downsample_method)
+            if entry[1]['year'] in years
+        ])
+        ops += self._replace([entry for entry in highlight_traces(*args) if entry[1]['year'] in years])
+        if self.consolidated_boxes:
+            ops += self._replace([
+                entry for entry in consolidated_box_traces(*args, precomputed=self.precomputed_boxes)
+                if entry[1]['year'] in years
+            ])
+            return ops + self._replace(month_shading_traces(*args))
+
+        months = sorted({month for _, month in affected})
+        boxes = box_traces(*args, precomputed=self.precomputed_boxes, months=months)
+        reshaped = False
+        for year, month in affected:
+            new = [entry for entry in boxes if (entry[1]['year'], entry[1]['month']) == (year, month)]
+            existing = self.registry.indices('Monthly Box Plot', year=year, month=month)
+            if new and existing:
+                ops += self._replace(new)
+            elif new:
+                ops += self._insert(self._box_position(year, month), new)
+                reshaped = True
+            elif existing:
+                ops += self._remove(existing)
+                reshaped = True
+        if reshaped:
+            ops += self._update_buttons()
+
+        shaded = go.Figure()
+        add_month_shading(shaded, *args)
+        if to_json_plotly(shaded.layout.shapes) != to_json_plotly(self.fig.layout.shapes):
+            self.fig.layout.shapes = shaded.layout.shapes
+            ops.append(('layout', ['shapes'], [shape.to_plotly_json() for shape in shaded.layout.shapes]))
+        return ops
+
+    # Swap in rebuilt traces that have the same tags as existing ones
+    def _replace(self, entries):
+        ops = []
+        for trace, tags in entries:
+            index = self.registry.indices(**tags)[0]
+            old = self.fig.data[index]
+            trace.visible = old.visible
+            props = _changed_props(old, trace)
+            if props:
+                self.registry.replace(index, trace)
+                ops.append(('update', index, props))
+        return ops
+
+    def _insert(self, position, entries):
+        for trace, tags in entries:
+            trace.visible = tags['view'] == DEFAULT_VIEW
+        self.registry.insert(position, entries)
+        return [('insert', position + offset, trace.to_plotly_json())
+                for offset, (trace, _) in enumerate(entries)]
+
+    def _remove(self, indices):
+        self.registry.remove(indices)
+        # Highest index first so earlier removals don't shift later ones
+        return [('remove', index, None) for index in sorted(indices, reverse=True)]
+
+    # Boxes are ordered by month, then current before historical year; a new
+    # month's traces go before the first box that sorts after them
+    def _box_position(self, year, month):
+        def order(tags):
+            return (box_months.index(tags['month']), 0 if tags['year'] == self.current_year else 1)
+
+        key = order({'year': year, 'month': month})
+        box_indices = self.registry.indices('Monthly Box Plot')
+        for index in box_indices:
+            if order(self.registry.tags[index]) > key:
+                return index
+        if box_indices:
+            return box_indices[-1] + 1
+        line_indices = self.registry.indices('Line Plot')
+        return line_indices[-1] + 1 if line_indices else 0
+
+    # The view buttons' visibility masks change length when traces are added
+    # or removed
+    def _update_buttons(self):
+        ops = []
+        buttons = self.fig.layout.updatemenus[0].buttons
+        for k, (button, view) in enumerate(zip(buttons, VIEWS)):
+            mask = self.registry.visibility(view)
+            button.args = [{'visible': mask}, button.args[1]]
+            ops.append(('layout', ['updatemenus', 0, 'buttons', k, 'args', 0, 'visible'], mask))
+        return ops
+
+
+# Replay FigureUpdater operations as a dash.Patch of a dcc.Graph figure.
+# Numeric arrays are sent typed-array encoded, so changed traces get their
+# arrays replaced rather than extended.
+def ops_to_patch(ops):
+    from dash import Patch
+    patched = Patch()
+    for kind, target, value in ops:
+        if kind == 'update':
+            for key, prop in value.items():
+                patched['data'][target][key] = prop
+        elif kind == 'insert':
+            patched['data'].insert(target, value)
+        elif kind == 'remove':
+            del patched['data'][target]
+        elif kind == 'layout':
+            node = patched['layout']
+            for key in target[:-1]:
+                node = node[key]
+            node[target[-1]] = value
+    return patched
@@ -0,0 +1,194 @@
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger('temperature.stages')
+
+# STAGE_MEMORY=1 traces allocations (tracemalloc) so each stage also reports
+# the memory it allocated; it slows everything down, so it is off by default.
+# STAGE_PROFILE=all (or a comma-separated list of stage names) runs those
+# stages under cProfile and writes {stage}-{n}.prof files to
+# STAGE_PROFILE_DIR (default: profiles/).
+
+
+def _profiled_stages():
+    value = os.environ.get('STAGE_PROFILE', '').strip()
+    if not value:
+        return set()
+    return {'*'} if value.lower() in ('1', 'all', 'true', 'yes') else {s.strip() for s in value.split(',')}
+
+
+class StageRun:
+    # Totals per named stage for one run (startup, one callback, ...):
+    # call count, wall time, process CPU time and, with memory tracing,
+    # net and peak allocated megabytes. Stages may run in worker threads.
+
+    def __init__(self, label):
+        self.label = label
+        self.started = datetime.now(timezone.utc)
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, wall, cpu, allocated=None, peak=None):
+        with self._lock:
+            entry = self.stages.setdefault(name, {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0})
+            entry['count'] += 1
+            entry['wall_s'] += wall
+            entry['cpu_s'] += cpu
+            if allocated is not None:
+                entry['alloc_mb'] = entry.get('alloc_mb', 0.0) + allocated / 1e6
+                entry['peak_mb'] = max(entry.get('peak_mb', 0.0), peak / 1e6)
+
+    def as_dict(self):
+        with self._lock:
+            stages = {name: dict(entry) for name, entry in self.stages.items()}
+        return {
+            'run': self.label,
+            'started': self.started.isoformat(timespec='seconds'),
+            'wall_s': time.perf_counter() - self.start_wall,
+            'cpu_s': time.process_time() - self.start_cpu,
+            'stages': stages,
+        }
+
+
+class StageRecorder:
+    # Records named stages into the active StageRun (a context variable, so
+    # concurrent Dash callbacks keep separate runs) and keeps the last
+    # max_runs finished runs. Stages outside any run go to a 'background' run.
+
+    def __init__(self, max_runs=20, memory=None, profile=None, profile_dir=None):
+        if memory is None:
+            memory = os.environ.get('STAGE_MEMORY', '').lower() in ('1', 'true', 'yes')
+        self.memory = memory
+        self.profile = _profiled_stages() if profile is None else set(profile)
+        self.profile_dir = Path(profile_dir or os.environ.get('STAGE_PROFILE_DIR', 'profiles'))
+        self.runs = deque(maxlen=max_runs)
+        self._background = StageRun('background')
+        self._active = contextvars.ContextVar('stage_run', default=None)
+        self._local = threading.local()
+        self._profile_count = 0
+        self._lock = threading.Lock()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def run(self, label):
+        current = self.begin(label)
+        try:
+            yield current
+        finally:
+            self.end(current)
+
+    # begin()/end() delimit a run that doesn't fit a with block (the
+    # top-level script); end() stores it and emits one JSON log line
+    def begin(self, label):
+        current = StageRun(label)
+        current.token = self._active.set(current)
+        return current
+
+    def end(self, current):
+        self._active.reset(current.token)
+        summary = current.as_dict()
+        with self._lock:
+            self.runs.append(summary)
+        logger.info(json.dumps({'event': 'stage_timings', **summary}, sort_keys=True))
+        return summary
+
+    def last_run(self):
+        with self._lock:
+            return self.runs[-1] if self.runs else None
+
+    def history(self):
+        with self._lock:
+            return list(self.runs)
+
+    @contextmanager
+    def stage(self, name):
+        current = self._active.get() or self._background
+        profiler = self._start_profile(name)
+        track_memory = self.memory and tracemalloc.is_tracing()
+        if track_memory:
+            # Nested stages share tracemalloc's single peak counter: fold the
+            # peak so far into the enclosing stage before resetting it
+            stack = self._memory_stack()
+            if stack:
+                stack[-1] = max(stack[-1], tracemalloc.get_traced_memory()[1])
+            start_mem = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            stack.append(0)
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            if track_memory:
+                end_mem, peak = tracemalloc.get_traced_memory()
+                peak = max(stack.pop(), peak)
+                if stack:
+                    stack[-1] = max(stack[-1], peak)
+                current.add(name, wall, cpu, end_mem - start_mem, peak - start_mem)
+            else:
+                current.add(name, wall, cpu)
+            if profiler is not None:
+                self._stop_profile(profiler, name)
+
+    def _memory_stack(self):
+        if not hasattr(self._local, 'memory_stack'):
+            self._local.memory_stack = []
+        return self._local.memory_stack
+
+    def _start_profile(self, name):
+        # cProfile profiles one thread and cannot nest
+        if not self.profile or ('*' not in self.profile and name not in self.profile):
+            return None
+        if getattr(self._local, 'profiling', False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler is already active
+            return None
+        self._local.profiling = True
+        return profiler
+
+    def _stop_profile(self, profiler, name):
+        profiler.disable()
+        self._local.profiling = False
+        with self._lock:
+            self._profile_count += 1
+            count = self._profile_count
+        try:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(self.profile_dir / f'{name}-{count}.prof'))
+        except OSError:
+            pass
+
+
+# Shared recorder used by the loading and figure modules
+recorder = StageRecorder()
+stage = recorder.stage
+
+
+# Decorator recording every call of a function as stage name
+def timed_stage(name):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
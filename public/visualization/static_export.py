@@ -0,0 +1,117 @@
+import argparse
+import json
+import math
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from temperature_data import align_to_reference_year
+from temperature_dataset import TemperatureDataset
+from temperature_stats import streaming_monthly_aggregates
+
+# Usage:
+#   python static_export.py --out-dir .. 2024 1990
+# Writes the files the static pages (public/visualization.html and
+# public/custom-visualization) fetch: temperature_data.csv, one row per
+# calendar day with Max/Avg/Min columns per year, and temperature_monthly.json
+# with the monthly statistics their box and bar views need.
+
+CSV_NAME = 'temperature_data.csv'
+MONTHLY_NAME = 'temperature_monthly.json'
+MONTH_LABELS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Wide column prefix for each standardized temperature column
+WIDE_PREFIXES = {'Max Temp': 'Max', 'Avg Temp': 'Avg', 'Min Temp': 'Min'}
+
+# Columns of temperature_stats.monthly_aggregates copied into the sidecar
+MONTHLY_STATS = [
+    'Max mean', 'Avg mean', 'Min mean', 'Max max', 'Min min',
+    'All min', 'All lowerfence', 'All q1', 'All median', 'All q3', 'All upperfence', 'All max', 'All mean',
+]
+
+
+# One row per calendar day of years[0] with {Max,Avg,Min}{year} columns for
+# every year, joined on month/day (years[0] supplies the dates; other years
+# are aligned onto it, Feb 29 falling on Feb 28 when it has none). Days
+# missing from a year are left empty; repeated readings keep the first.
+def wide_daily_frame(dataset, years, station=None):
+    reference_year = years[0]
+    columns = []
+    for year in years:
+        frame = dataset.select(year=year, station=station)
+        dates = align_to_reference_year(frame['Date'], reference_year)
+        wide = frame[list(WIDE_PREFIXES)].rename(columns={col: f'{prefix}{year}' for col, prefix in WIDE_PREFIXES.items()})
+        wide.index = pd.DatetimeIndex(dates, name='Date')
+        columns.append(wide[~wide.index.duplicated(keep='first')])
+    table = pd.concat(columns, axis=1, join='outer').sort_index()
+    table.index = table.index.strftime('%Y-%m-%d')
+    return table
+
+
+def _json_number(value, digits):
+    value = float(value)
+    return None if math.isnan(value) else round(value, digits)
+
+
+# Monthly statistics per year as {'months', 'stats', 'years': {year: {stat:
+# [12 values]}}}; months without data are null. The box statistics are the
+# ones plotly.js would compute from the daily values (pooled Max/Avg/Min).
+# table is the station's monthly_aggregates (default: the dataset's).
+def monthly_summary(dataset, years, station=None, digits=2, table=None):
+    station = station or dataset.default_station
+    if table is None:
+        table = dataset.monthly_aggregates(station)
+    summary = {'station': station, 'months': MONTH_LABELS, 'stats': MONTHLY_STATS, 'years': {}}
+    for year in years:
+        rows = table.loc[year].reindex(range(1, 13)) if year in table.index.unique('year') else None
+        summary['years'][str(year)] = {
+            stat: [None] * 12 if rows is None else [_json_number(v, digits) for v in rows[stat].to_numpy()]
+            for stat in MONTHLY_STATS
+        }
+    return summary
+
+
+# Write CSV_NAME and MONTHLY_NAME to out_dir; returns their paths
+def export_static_data(dataset, years, out_dir, station=None, monthly_table=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    csv_path = out_dir / CSV_NAME
+    wide_daily_frame(dataset, years, station).to_csv(csv_path, float_format='%.1f', lineterminator='\n')
+    json_path = out_dir / MONTHLY_NAME
+    json_path.write_text(json.dumps(monthly_summary(dataset, years, station, table=monthly_table),
+                                    separators=(',', ':')),
+                         encoding='utf-8')
+    return csv_path, json_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write the daily CSV and monthly JSON used by the static pages.')
+    parser.add_argument('years', type=int, nargs='+', help='years to include; the first supplies the dates')
+    parser.add_argument('--station', help='station to export (default: the data directory\'s own CSVs)')
+    parser.add_argument('--data-dir', default='.')
+    parser.add_argument('--out-dir', default='..', help='where the static pages fetch their data (default: ..)')
+    parser.add_argument('--stream', action='store_true',
+                        help='load only the given years and aggregate the monthly statistics while reading '
+                             'the CSVs in chunks (bounded memory for long records)')
+    args = parser.parse_args(argv)
+
+    dataset = TemperatureDataset(args.data_dir)
+    if args.stream:
+        dataset.files = [entry for entry in dataset.files if entry[1] in args.years]
+    dataset.load()
+    missing = [year for year in args.years if year not in dataset.years(args.station)]
+    if missing:
+        parser.error(f"no data for year(s) {', '.join(map(str, missing))}")
+    monthly_table = None
+    if args.stream:
+        station = args.station or dataset.default_station
+        paths = [path for file_station, _, _, path in dataset.files if file_station == station]
+        monthly_table = streaming_monthly_aggregates(paths, station).loc[station]
+    for path in export_static_data(dataset, args.years, args.out_dir, args.station, monthly_table):
+        print(f"Wrote {path} ({path.stat().st_size / 1e3:.1f} KB)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,247 @@
+import calendar
+import contextvars
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage, timed_stage
+
+# List of months for file naming
+months = [
+    'january', 'february', 'march', 'april', 'may', 'june',
+    'july', 'august', 'september', 'october', 'november', 'december'
+]
+
+# Older exports use the long column names, newer ones the short ones
+COLUMN_RENAMES = {
+    'Max Temperature': 'Max Temp',
+    'Min Temperature': 'Min Temp',
+    'Avg Temperature': 'Avg Temp'
+}
+TEMP_COLUMNS = ['Max Temp', 'Min Temp', 'Avg Temp']
+
+# Binary cache of standardized frames, stored next to the CSVs
+CACHE_DIR_NAME = '.temperature_cache'
+CACHE_VERSION = 2
+
+
+def cache_rebuild_requested():
+    # Set REBUILD_CACHE=1 to ignore (and overwrite) every cached file
+    return os.environ.get('REBUILD_CACHE', '').lower() in ('1', 'true', 'yes')
+
+
+# Downcast a standardized frame: temperatures and other floats become
+# float32, whole-number columns (HDD, CDD, Snow Depth) become int16
+def _compact_dtypes(df):
+    for col in df.columns:
+        if col == 'Date':
+            continue
+        values = df[col]
+        if col in TEMP_COLUMNS or pd.api.types.is_float_dtype(values):
+            df[col] = values.astype(np.float32)
+        elif pd.api.types.is_integer_dtype(values):
+            if values.empty or (values.min() >= np.iinfo(np.int16).min and values.max() <= np.iinfo(np.int16).max):
+                df[col] = values.astype(np.int16)
+            else:
+                df[col] = values.astype(np.float32)
+    return df
+
+
+def _read_and_standardize(filename):
+    with stage('read_csv'):
+        df = pd.read_csv(filename)
+    with stage('standardize'):
+        df['Date'] = pd.to_datetime(df['Date'])
+        df = df.rename(columns=COLUMN_RENAMES)
+        return _compact_dtypes(df)
+
+
+# The cache key is the CSV's absolute path; mtime and size are stored inside
+# the cache file and checked on load, so an edited CSV is re-parsed
+def _cache_path(filename):
+    source = Path(filename).resolve()
+    digest = hashlib.sha1(str(source).encode('utf-8')).hexdigest()[:16]
+    return source.parent / CACHE_DIR_NAME / f"{source.stem}-{digest}.npz"
+
+
+def _source_signature(filename):
+    stat = os.stat(filename)
+    return np.array([CACHE_VERSION, stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def _read_cache(cache_file, signature):
+    try:
+        with np.load(cache_file, allow_pickle=False) as data:
+            if not np.array_equal(data['__signature__'], signature):
+                return None
+            columns = [str(c) for c in data['__columns__']]
+            frame = {}
+            for i, col in enumerate(columns):
+                values = data[f'col_{i}']
+                if values.dtype.kind == 'U':
+                    values = values.astype(object)
+                    if f'null_{i}' in data:
+                        values[data[f'null_{i}']] = np.nan
+                frame[col] = values
+            return pd.DataFrame(frame, columns=columns)
+    except (OSError, KeyError, ValueError):
+        # Missing, truncated or foreign cache file: fall back to the CSV
+        return None
+
+
+def _write_cache(cache_file, signature, df):
+    arrays = {
+        '__signature__': signature,
+        '__columns__': np.array(df.columns, dtype=str),
+    }
+    for i, col in enumerate(df.columns):
+        values = df[col].to_numpy()
+        if values.dtype == object:
+            # Text columns are stored as fixed-width strings, which have no
+            # null: missing cells are kept as a mask next to them
+            nulls = pd.isna(values)
+            if nulls.any():
+                arrays[f'null_{i}'] = nulls
+                values = np.where(nulls, '', values)
+            values = values.astype(str)
+        arrays[f'col_{i}'] = values
+    try:
+        cache_file.parent.mkdir(exist_ok=True)
+        tmp_file = cache_file.with_name(cache_file.name + f'.{os.getpid()}.tmp')
+        with open(tmp_file, 'wb') as fh:
+            np.savez(fh, **arrays)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # Read-only data directory: caching is best effort
+        pass
+
+
+# Helper function to load and standardize a month's data.
+# Standardized frames are cached as .npz files keyed by path + mtime + size;
+# pass use_cache=False to skip the cache or rebuild=True to overwrite it.
+def load_and_standardize_csv(filename, use_cache=True, rebuild=None):
+    if not use_cache:
+        return _read_and_standardize(filename)
+    if rebuild is None:
+        rebuild = cache_rebuild_requested()
+    cache_file = _cache_path(filename)
+    signature = _source_signature(filename)
+    if not rebuild:
+        with stage('read_cache'):
+            df = _read_cache(cache_file, signature)
+        if df is not None:
+            return df
+    df = _read_and_standardize(filename)
+    _write_cache(cache_file, signature, df)
+    return df
+
+
+# --- Streaming reader for large exports ---
+DEFAULT_CHUNK_ROWS = 100000
+
+# Only these columns are read (under either naming); everything else in the
+# export (Departure, HDD, CDD, Precipitation, ...) is never parsed. They are
+# read as text and converted chunk by chunk, so a marker such as 'M'
+# (missing) becomes NaN instead of failing the read.
+STREAM_COLUMNS = set(TEMP_COLUMNS) | set(COLUMN_RENAMES)
+
+
+def _stream_column(name):
+    return name == 'Date' or name in STREAM_COLUMNS
+
+
+# Read a (possibly decades-long) daily CSV in chunks of chunksize rows,
+# yielding standardized Date + TEMP_COLUMNS frames (float32 temperatures).
+# Memory use is bounded by one chunk regardless of file size.
+def iter_csv_chunks(filename, chunksize=DEFAULT_CHUNK_ROWS):
+    reader = pd.read_csv(
+        filename,
+        usecols=_stream_column,
+        dtype={col: object for col in STREAM_COLUMNS},
+        parse_dates=['Date'],
+        chunksize=chunksize,
+    )
+    with reader:
+        for chunk in reader:
+            chunk = chunk.rename(columns=COLUMN_RENAMES)[['Date'] + TEMP_COLUMNS]
+            for col in TEMP_COLUMNS:
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype(np.float32)
+            yield chunk
+
+
+# Move dates onto reference_year, keeping month and day, so that several
+# years can be overlaid on one date axis. Works on whole arrays (no
+# per-row Python): each date becomes Jan 1 of the reference year plus the
+# day-of-year offset of its month/day in that year. Feb 29 maps to Feb 28
+# when the reference year is not a leap year.
+@timed_stage('align_dates')
+def align_to_reference_year(dates, reference_year):
+    dates = pd.Series(dates)
+    month = dates.dt.month.to_numpy()
+    day = dates.dt.day.to_numpy()
+    month_lengths = np.array([calendar.monthrange(reference_year, m)[1] for m in range(1, 13)])
+    month_starts = np.concatenate(([0], np.cumsum(month_lengths)[:-1]))
+    offsets = month_starts[month - 1] + np.minimum(day, month_lengths[month - 1]) - 1
+    aligned = np.datetime64(f'{reference_year}-01-01', 'ns') + offsets.astype('timedelta64[D]')
+    return pd.Series(aligned, index=dates.index, name=dates.name).astype(dates.dtype)
+
+
+def _timed_load(filename, use_cache, rebuild):
+    start = time.perf_counter()
+    try:
+        df = load_and_standardize_csv(filename, use_cache=use_cache, rebuild=rebuild)
+        error = None
+    except Exception as exc:  # reported per file, never aborts the batch
+        df = None
+        error = f"{type(exc).__name__}: {exc}"
+    return df, time.perf_counter() - start, error
+
+
+def load_workers_from_env():
+    # LOAD_WORKERS=N sets the pool size; unset uses the executor default
+    value = os.environ.get('LOAD_WORKERS')
+    return int(value) if value else None
+
+
+# Load many CSVs concurrently. Returns (frames, report) where frames is in
+# the same order as filenames (None for files that failed) and report has
+# one {'file', 'seconds', 'error'} entry per file, also in input order.
+# Threads suit network storage; use_processes=True parallelizes parsing.
+def load_csvs_parallel(filenames, max_workers=None, use_processes=False,
+                       use_cache=True, rebuild=None, verbose=False):
+    filenames = list(filenames)
+    if max_workers is None:
+        max_workers = load_workers_from_env()
+    if rebuild is None:
+        rebuild = cache_rebuild_requested()
+    frames = [None] * len(filenames)
+    report = [None] * len(filenames)
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=max_workers) as pool:
+        # Threads run in a copy of the caller's context so their stages are
+        # recorded in the caller's instrumentation run
+        futures = {
+            (pool.submit(_timed_load, filename, use_cache, rebuild) if use_processes
+             else pool.submit(contextvars.copy_context().run, _timed_load, filename, use_cache, rebuild)): i
+            for i, filename in enumerate(filenames)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            df, seconds, error = future.result()
+            frames[i] = df
+            report[i] = {'file': str(filenames[i]), 'seconds': seconds, 'error': error}
+    for entry in report:
+        if entry['error']:
+            print(f"Failed to load {entry['file']}: {entry['error']}")
+        elif verbose:
+            print(f"Loaded {entry['file']} in {entry['seconds'] * 1000:.1f} ms")
+    if verbose and report:
+        total = sum(entry['seconds'] for entry in report)
+        failed = sum(1 for entry in report if entry['error'])
+        print(f"Loaded {len(report) - failed}/{len(report)} files ({total:.2f} s of file time)")
+    return frames, report
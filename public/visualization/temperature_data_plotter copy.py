@@ -1,6 +1,9 @@
 import pandas as pd
 import plotly.graph_objects as go
 
+from temperature_data import align_to_reference_year
+from temperature_figures import daily_scatter_class
+
 # Read the recent CSV files
 df_dec_24 = pd.read_csv('december_2024_temperature_data.csv')
 
@@ -32,8 +35,8 @@ df_jan_25 = df_jan_25.rename(columns={
 })
 
 # Adjust historical dates to overlay with current dates
-df_dec_90['Adjusted_Date'] = pd.to_datetime('2024-12-' + df_dec_90['Date'].dt.strftime('%d'))
-df_jan_91['Adjusted_Date'] = pd.to_datetime('2025-01-' + df_jan_91['Date'].dt.strftime('%d'))
+df_dec_90['Adjusted_Date'] = align_to_reference_year(df_dec_90['Date'], 2024)
+df_jan_91['Adjusted_Date'] = align_to_reference_year(df_jan_91['Date'], 2025)
 
 # Rename columns to match the data format
 df_jan_91 = df_jan_91.rename(columns={
@@ -47,6 +50,9 @@ df_dec_90 = df_dec_90.rename(columns={
     'Avg Temperature': 'Avg Temp'
 })
 
+# Large overlays are drawn with WebGL (see WEBGL_POINT_THRESHOLD)
+line_trace = daily_scatter_class(3 * (len(df_dec_24) + len(df_jan_25) + len(df_dec_90) + len(df_jan_91)))
+
 # Create an interactive plot
 fig = go.Figure()
 
@@ -68,19 +74,19 @@ colors = {
 
 # December 2024 data (solid lines)
 fig.add_trace(
-    go.Scatter(x=df_dec_24['Date'], y=df_dec_24['Max Temp'],
+    line_trace(x=df_dec_24['Date'], y=df_dec_24['Max Temp'],
                name='Maximum (2024-25)',
                line=dict(color=colors['max']['recent']), mode='lines+markers',
                legendgroup='max', showlegend=True)
 )
 fig.add_trace(
-    go.Scatter(x=df_dec_24['Date'], y=df_dec_24['Min Temp'],
+    line_trace(x=df_dec_24['Date'], y=df_dec_24['Min Temp'],
                name='Minimum (2024-25)',
                line=dict(color=colors['min']['recent']), mode='lines+markers',
                legendgroup='min', showlegend=True)
 )
 fig.add_trace(
-    go.Scatter(x=df_dec_24['Date'], y=df_dec_24['Avg Temp'],
+    line_trace(x=df_dec_24['Date'], y=df_dec_24['Avg Temp'],
                name='Average (2024-25)',
                line=dict(color=colors['avg']['recent']), mode='lines+markers',
                legendgroup='avg', showlegend=True)
@@ -88,19 +94,19 @@ fig.add_trace(
 
 # January 2025 data (solid lines)
 fig.add_trace(
-    go.Scatter(x=df_jan_25['Date'], y=df_jan_25['Max Temp'],
+    line_trace(x=df_jan_25['Date'], y=df_jan_25['Max Temp'],
                name='Maximum (2024-25)',
                line=dict(color=colors['max']['recent']), mode='lines+markers',
                legendgroup='max', showlegend=False)
 )
 fig.add_trace(
-    go.Scatter(x=df_jan_25['Date'], y=df_jan_25['Min Temp'],
+    line_trace(x=df_jan_25['Date'], y=df_jan_25['Min Temp'],
                name='Minimum (2024-25)',
                line=dict(color=colors['min']['recent']), mode='lines+markers',
                legendgroup='min', showlegend=False)
 )
 fig.add_trace(
-    go.Scatter(x=df_jan_25['Date'], y=df_jan_25['Avg Temp'],
+    line_trace(x=df_jan_25['Date'], y=df_jan_25['Avg Temp'],
                name='Average (2024-25)',
                line=dict(color=colors['avg']['recent']), mode='lines+markers',
                legendgroup='avg', showlegend=False)
@@ -108,19 +114,19 @@ fig.add_trace(
 
 # December 1990 data (dotted lines)
 fig.add_trace(
-    go.Scatter(x=df_dec_90['Adjusted_Date'], y=df_dec_90['Max Temp'],
+    line_trace(x=df_dec_90['Adjusted_Date'], y=df_dec_90['Max Temp'],
                name='Maximum (1990-91)',
                line=dict(color=colors['max']['historical'], dash='dot'), mode='lines+markers',
                legendgroup='max', showlegend=True)
 )
 fig.add_trace(
-    go.Scatter(x=df_dec_90['Adjusted_Date'], y=df_dec_90['Min Temp'],
+    line_trace(x=df_dec_90['Adjusted_Date'], y=df_dec_90['Min Temp'],
                name='Minimum (1990-91)',
                line=dict(color=colors['min']['historical'], dash='dot'), mode='lines+markers',
                legendgroup='min', showlegend=True)
 )
 fig.add_trace(
-    go.Scatter(x=df_dec_90['Adjusted_Date'], y=df_dec_90['Avg Temp'],
+    line_trace(x=df_dec_90['Adjusted_Date'], y=df_dec_90['Avg Temp'],
                name='Average (1990-91)',
                line=dict(color=colors['avg']['historical'], dash='dot'), mode='lines+markers',
                legendgroup='avg', showlegend=True)
@@ -128,19 +134,19 @@ fig.add_trace(
 
 # January 1991 data (dotted lines)
 fig.add_trace(
-    go.Scatter(x=df_jan_91['Adjusted_Date'], y=df_jan_91['Max Temp'],
+    line_trace(x=df_jan_91['Adjusted_Date'], y=df_jan_91['Max Temp'],
                name='Maximum (1990-91)',
                line=dict(color=colors['max']['historical'], dash='dot'), mode='lines+markers',
                legendgroup='max', showlegend=False)
 )
 fig.add_trace(
-    go.Scatter(x=df_jan_91['Adjusted_Date'], y=df_jan_91['Min Temp'],
+    line_trace(x=df_jan_91['Adjusted_Date'], y=df_jan_91['Min Temp'],
                name='Minimum (1990-91)',
                line=dict(color=colors['min']['historical'], dash='dot'), mode='lines+markers',
                legendgroup='min', showlegend=False)
 )
 fig.add_trace(
-    go.Scatter(x=df_jan_91['Adjusted_Date'], y=df_jan_91['Avg Temp'],
+    line_trace(x=df_jan_91['Adjusted_Date'], y=df_jan_91['Avg Temp'],
                name='Average (1990-91)',
                line=dict(color=colors['avg']['historical'], dash='dot'), mode='lines+markers',
                legendgroup='avg', showlegend=False)
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from instrumentation import stage
+from temperature_data import load_csvs_parallel, months
+from temperature_stats import day_of_year_matrix, day_of_year_percentiles, monthly_aggregates
+
+# Files are named {month}_{year}_temperature_data.csv; copies exported
+# from other tools sometimes carry a suffix such as " copy"
+FILE_PATTERN = re.compile(r'^(?P<month>[a-z]+)_(?P<year>\d{4})_temperature_data(?P<suffix>[^/]*)\.csv$')
+
+# CSVs directly in the data directory belong to this station; CSVs in a
+# subdirectory belong to the station named after that subdirectory
+DEFAULT_STATION = 'phoenix'
+
+INDEX_LEVELS = ['station', 'year', 'month', 'day']
+
+
+# Find every monthly CSV under data_dir as (station, year, month, path) tuples
+def discover_csv_files(data_dir='.'):
+    root = Path(data_dir)
+    found = {}
+    candidates = list(root.glob('*_temperature_data*.csv')) + list(root.glob('*/*_temperature_data*.csv'))
+    for path in candidates:
+        match = FILE_PATTERN.match(path.name)
+        if not match or match.group('month') not in months:
+            continue
+        station = DEFAULT_STATION if path.parent == root else path.parent.name
+        key = (station, int(match.group('year')), months.index(match.group('month')) + 1)
+        # Prefer the canonical file name when a suffixed copy also exists
+        if key not in found or not match.group('suffix'):
+            found[key] = path
+    return [key + (found[key],) for key in sorted(found)]
+
+
+# Path, modification time and size of a CSV, to notice files replaced on disk
+def _file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (str(path), stat.st_mtime_ns, stat.st_size)
+
+
+class TemperatureDataset:
+    # All monthly CSVs of all stations in one long-format frame indexed by
+    # (station, year, month, day), loaded once and sliced without re-reading
+
+    def __init__(self, data_dir='.'):
+        self.data_dir = Path(data_dir)
+        self.files = discover_csv_files(self.data_dir)
+        self.data = None
+        self.load_report = []
+        self._file_states = {}
+        self._monthly = None
+        self._day_matrices = {}
+        self._climatologies = {}
+        self._fingerprint = None
+
+    # Files are read concurrently (see load_csvs_parallel); a file that fails
+    # to load is reported and left out instead of aborting the whole load
+    def load(self, max_workers=None, use_processes=False, verbose=False):
+        with stage('load'):
+            frames, _ = self._load_files(self.files, max_workers, use_processes, verbose)
+            if not frames:
+                raise FileNotFoundError(f"No loadable *_temperature_data.csv files found in {self.data_dir.resolve()}")
+            self.data = self._index_frames(frames)
+        self._monthly = None
+        self._day_matrices = {}
+        self._climatologies = {}
+        self._fingerprint = None
+        return self
+
+    # Pick up new, changed and deleted CSVs without reloading the rest: only
+    # the affected (station, year, month) rows are replaced and only their
+    # monthly aggregates recomputed. Returns the sorted list of affected
+    # (station, year, month) keys (empty when nothing changed on disk)
+    def refresh(self, max_workers=None, use_processes=False, verbose=False):
+        files = discover_csv_files(self.data_dir)
+        current = {(station, year, month): path for station, year, month, path in files}
+        changed = [entry for entry in files if self._file_states.get(entry[:3]) != _file_state(entry[3])]
+        removed = [key for key in self._file_states if key not in current]
+        if not changed and not removed:
+            return []
+        frames, loaded = self._load_files(changed, max_workers, use_processes, verbose)
+        for key in removed:
+            del self._file_states[key]
+        # A file that failed to load keeps its previous rows until it loads
+        affected = sorted(set(removed) | set(loaded))
+        if not affected:
+            return []
+        self.files = files
+
+        months_index = self.data.index.droplevel('day')
+        kept = self.data[~months_index.isin(affected)]
+        updated = self._index_frames(frames) if frames else kept.iloc[:0]
+        self.data = pd.concat([kept, updated]).sort_index()
+        if self._monthly is not None:
+            monthly = self._monthly[~self._monthly.index.isin(affected)]
+            if len(updated):
+                monthly = pd.concat([monthly, monthly_aggregates(updated)]).sort_index()
+            self._monthly = monthly
+        self._day_matrices = {}
+        self._climatologies = {}
+        self._fingerprint = None
+        return affected
+
+    # Load files ((station, year, month, path) tuples) and record their
+    # path/size/mtime; returns the frames that loaded, tagged with their
+    # station, and their (station, year, month) keys
+    def _load_files(self, files, max_workers, use_processes, verbose):
+        loaded, self.load_report = load_csvs_parallel(
+            [path for _, _, _, path in files],
+            max_workers=max_workers,
+            use_processes=use_processes,
+            verbose=verbose,
+        )
+        frames, keys = [], []
+        for (station, year, month, path), df in zip(files, loaded):
+            if df is None:
+                self._file_states.setdefault((station, year, month), None)
+                continue
+            self._file_states[(station, year, month)] = _file_state(path)
+            df.insert(0, 'station', station)
+            frames.append(df)
+            keys.append((station, year, month))
+        return frames, keys
+
+    def _index_frames(self, frames):
+        data = pd.concat(frames, ignore_index=True)
+        data['year'] = data['Date'].dt.year
+        data['month'] = data['Date'].dt.month
+        data['day'] = data['Date'].dt.day
+        return data.set_index(INDEX_LEVELS).sort_index()
+
+    def stations(self):
+        return list(self.data.index.unique('station'))
+
+    @property
+    def default_station(self):
+        stations = self.stations()
+        return DEFAULT_STATION if DEFAULT_STATION in stations else stations[0]
+
+    def years(self, station=None):
+        station = station or self.default_station
+        return list(self.data.loc[station].index.unique('year'))
+
+    # Rows for one station and one or more years, shaped like a single
+    # concatenated year of CSVs (Date first, plain RangeIndex)
+    def select(self, year=None, station=None, years=None):
+        station = station or self.default_station
+        frame = self.data.loc[station]
+        if year is not None:
+            years = [year]
+        if years is not None:
+            frame = frame.loc[frame.index.get_level_values('year').isin(years)]
+        return frame.reset_index(drop=True)
+
+    # Rows of one (year, month) as an index lookup instead of a boolean mask
+    def month_frame(self, year, month, station=None):
+        station = station or self.default_station
+        return self.data.loc[(station, year, month)]
+
+    # Per-(station, year, month) statistics, computed once and reused by
+    # every figure section (see temperature_stats.monthly_aggregates)
+    def monthly_aggregates(self, station=None):
+        if self._monthly is None:
+            with stage('aggregate'):
+                self._monthly = monthly_aggregates(self.data)
+        if station is None:
+            return self._monthly
+        return self._monthly.loc[station]
+
+    # (years, years x 366 matrix) of one temperature column by day of year
+    # (see temperature_stats.day_of_year_matrix), built once per station and
+    # column; the matrix is shared, so it is read-only
+    def day_of_year_matrix(self, column='Avg Temp', station=None):
+        station = station or self.default_station
+        key = (station, column)
+        if key not in self._day_matrices:
+            with stage('aggregate'):
+                years, matrix = day_of_year_matrix(self.data.loc[station], column)
+            matrix.flags.writeable = False
+            self._day_matrices[key] = (years, matrix)
+        return self._day_matrices[key]
+
+    # Day-of-year percentiles (temperature_stats.CLIMATOLOGY_PERCENTILES) of
+    # column across the years of baseline, a (start, end) window of a
+    # station, taken from the cached day-of-year matrix and kept per
+    # (station, column, baseline); read-only like the matrix
+    def climatology(self, baseline, column='Avg Temp', station=None):
+        station = station or self.default_station
+        start, end = baseline
+        key = (station, column, start, end)
+        if key not in self._climatologies:
+            years, matrix = self.day_of_year_matrix(column, station)
+            with stage('aggregate'):
+                bands = day_of_year_percentiles(matrix[(years >= start) & (years <= end)])
+            bands.flags.writeable = False
+            self._climatologies[key] = bands
+        return self._climatologies[key]
+
+    # Short hash of the path/mtime/size of a station's loaded CSVs: the same in
+    # every process (e.g. gunicorn workers) that has loaded the same files
+    def state_version(self, station=None):
+        station = station or self.default_station
+        states = sorted((list(key), state) for key, state in self._file_states.items() if key[0] == station)
+        return hashlib.sha1(json.dumps(states).encode('utf-8')).hexdigest()[:16]
+
+    # Content hash of the loaded data, used to key caches of derived figures
+    def fingerprint(self):
+        if self._fingerprint is None:
+            hashed = pd.util.hash_pandas_object(self.data, index=True).to_numpy()
+            self._fingerprint = hashlib.sha1(hashed.tobytes()).hexdigest()
+        return self._fingerprint
@@ -0,0 +1,946 @@
+import calendar
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.colors import hex_to_rgb, find_intermediate_color
+
+from downsample import downsample_indices
+from instrumentation import timed_stage
+from temperature_data import align_to_reference_year
+from temperature_stats import LEAP_DAY_COLUMN
+from trace_registry import TraceRegistry
+
+# Views of the comparison, in button/tab order
+VIEWS = ['Line Plot', 'Monthly Box Plot', 'Highlight Differences', 'Calendar Heatmap']
+DEFAULT_VIEW = 'Line Plot'
+
+
+# Color and style definitions
+def rgba(hex_color, alpha):
+    rgb = hex_to_rgb(hex_color)
+    return f'rgba({rgb[0]},{rgb[1]},{rgb[2]},{alpha})'
+
+
+def interpolate_color(val, vmin, vmax, color1, color2):
+    # val in [vmin, vmax] mapped between color1 and color2
+    frac = (val - vmin) / (vmax - vmin) if vmax > vmin else 0.5
+    return find_intermediate_color(color1, color2, frac, colortype='rgb')
+
+
+current_colors = {
+    'Max': '#4A90E2',
+    'Min': '#66BB6A',
+    'Avg': '#AB47BC',
+}
+historical_colors = {
+    'Max': '#73A3B3',
+    'Min': '#A8BFA8',
+    'Avg': '#C3A6C7',
+}
+
+line_series = [
+    ('Max', 'Max Temp', 'Maximum Temperature'),
+    ('Avg', 'Avg Temp', 'Average Temperature'),
+    ('Min', 'Min Temp', 'Minimum Temperature')
+]
+
+box_months = list(range(1, 13))
+highlight_months = [2, 6, 7, 8, 9, 10, 12]
+bar_categories = ['Max', 'Avg', 'Min']
+bar_colors_current = {'Max': '#4A90E2', 'Avg': '#AB47BC', 'Min': '#66BB6A'}
+bar_colors_historical = {'Max': '#73A3B3', 'Avg': '#C3A6C7', 'Min': '#A8BFA8'}
+
+
+# Daily-series traces switch from SVG (go.Scatter) to WebGL (go.Scattergl)
+# once a figure draws more points than this; WEBGL_POINT_THRESHOLD overrides
+DEFAULT_WEBGL_POINT_THRESHOLD = 20000
+
+
+def webgl_point_threshold():
+    value = os.environ.get('WEBGL_POINT_THRESHOLD')
+    return int(value) if value else DEFAULT_WEBGL_POINT_THRESHOLD
+
+
+# Trace class for daily line series totalling n_points points. Scattergl
+# accepts the same hovertemplate, legendgroup and line dash settings.
+def daily_scatter_class(n_points, threshold=None):
+    if threshold is None:
+        threshold = webgl_point_threshold()
+    return go.Scattergl if n_points > threshold else go.Scatter
+
+
+# x-axis settings each view switches to (also used by the updatemenus buttons)
+view_xaxes = {
+    'Line Plot': {'type': 'date', 'title': 'Date / Month', 'tickangle': 45, 'automargin': True},
+    'Monthly Box Plot': {'type': 'category', 'title': 'Month', 'categoryorder': 'array', 'automargin': True},
+    'Highlight Differences': {'type': 'category', 'title': 'Month', 'automargin': True},
+    'Calendar Heatmap': {'type': 'date', 'title': 'Day of year', 'tickformat': '%b', 'dtick': 'M1',
+                         'automargin': True},
+}
+
+month_names = [calendar.month_abbr[m] for m in range(1, 13)]
+
+
+# y-axis type of view. The heatmap's rows are years given as strings, so a
+# station with missing years still gets one row per year instead of rows
+# stretched across the gaps; the other views plot temperatures
+def view_yaxis_type(view):
+    return 'category' if view == 'Calendar Heatmap' else 'linear'
+
+
+# x-axis settings of view; consolidated figures have no month pin traces, so
+# the category views list the months explicitly (and keep all twelve shown)
+def view_xaxis(view, consolidated=False):
+    xaxis = dict(view_xaxes[view])
+    if consolidated and xaxis['type'] == 'category':
+        xaxis.update(categoryorder='array', categoryarray=month_names, range=[-0.5, len(month_names) - 0.5])
+    return xaxis
+
+
+# Rows of df to draw for column col: those inside x_range (a pair of dates on
+# the line view's axis), thinned to at most max_points (see downsample.py)
+def _line_points(df, col, max_points, method, x_range):
+    if x_range is not None:
+        start, end = pd.Timestamp(x_range[0]), pd.Timestamp(x_range[1])
+        df = df[(df['Date'] >= start) & (df['Date'] <= end)]
+    if max_points is None or len(df) <= max_points:
+        return df
+    return df.iloc[downsample_indices(df['Date'], df[col], max_points, method)]
+
+
+# Every *_trace_specs builder below returns a list of (spec, tags) pairs:
+# spec is the trace as a plain plotly.js dict (with its 'type') and tags
+# records the trace's view, year and stat for TraceRegistry. The matching
+# *_traces builder returns the same traces as graph_objects; fast_figures.py
+# assembles the specs directly.
+
+# graph_objects class of each trace type used here
+TRACE_CLASSES = {
+    'scatter': go.Scatter,
+    'scattergl': go.Scattergl,
+    'box': go.Box,
+    'bar': go.Bar,
+    'heatmap': go.Heatmap,
+}
+
+
+def graph_object_trace(spec):
+    props = dict(spec)
+    return TRACE_CLASSES[props.pop('type')](**props)
+
+
+# *_traces version of a *_trace_specs builder
+def _graph_objects(build_specs):
+    @functools.wraps(build_specs)
+    def build(*args, **kwargs):
+        return [(graph_object_trace(spec), tags) for spec, tags in build_specs(*args, **kwargs)]
+    return build
+
+
+# --- Enhanced Line Plot Traces ---
+# max_points caps the points per trace ('lttb' or 'minmax' downsampling);
+# x_range restricts the traces to a zoomed window so it can be re-sampled
+# at full resolution; webgl_threshold picks SVG vs WebGL traces
+@timed_stage('line_traces')
+def line_trace_specs(dataset, station, current_year, historical_year, visible=True,
+                     max_points=None, downsample_method='lttb', x_range=None,
+                     webgl_threshold=None):
+    df_current = dataset.select(year=current_year, station=station)
+    df_historical = dataset.select(year=historical_year, station=station)
+    # Shifted copy of the historical year so both share one date axis; the
+    # real dates are kept as hover labels
+    df_historical_line = df_historical.copy()
+    df_historical_line['Date'] = align_to_reference_year(df_historical_line['Date'], current_year)
+    df_historical_line['Label'] = df_historical['Date'].dt.strftime('%b %d, %Y')
+
+    current_points = [
+        _line_points(df_current, col, max_points, downsample_method, x_range)
+        for _, col, _ in line_series
+    ]
+    historical_points = [
+        _line_points(df_historical_line, col, max_points, downsample_method, x_range)
+        for _, col, _ in line_series
+    ]
+    scatter = daily_scatter_class(
+        sum(len(points) for points in current_points + historical_points), webgl_threshold)
+    trace_type = 'scattergl' if scatter is go.Scattergl else 'scatter'
+
+    traces = []
+    # Add current year traces
+    for (temp_type, col, group), points in zip(line_series, current_points):
+        traces.append((dict(
+            type=trace_type,
+            x=points['Date'].to_numpy(),
+            y=points[col].to_numpy(),
+            name=f"{current_year} {temp_type}",
+            mode='lines+markers',
+            marker=dict(size=2),
+            line=dict(color=current_colors[temp_type], width=1),
+            legendgroup=group,
+            legendgrouptitle=dict(text=group),  # Only first trace in group will show group title
+            hovertemplate='%{x|%b %d, %Y}<br>'+temp_type+': %{y}°F<extra></extra>',
+            showlegend=True,
+            visible=visible
+        ), {'view': 'Line Plot', 'year': current_year, 'stat': temp_type}))
+    # Add historical year traces
+    for (temp_type, col, group), points in zip(line_series, historical_points):
+        traces.append((dict(
+            type=trace_type,
+            x=points['Date'].to_numpy(),
+            y=points[col].to_numpy(),
+            name=f"{historical_year} {temp_type}",
+            mode='lines+markers',
+            marker=dict(size=1.5),
+            line=dict(color=historical_colors[temp_type], width=1, dash='dot'),
+            legendgroup=group,
+            customdata=points['Label'].to_numpy(),
+            hovertemplate='%{customdata}<br>'+temp_type+': %{y}°F<extra></extra>',
+            showlegend=True,
+            visible=visible
+        ), {'view': 'Line Plot', 'year': historical_year, 'stat': temp_type}))
+    return traces
+
+
+line_traces = _graph_objects(line_trace_specs)
+
+
+# Indices of the daily line traces in figure (a go.Figure or a figure dict),
+# in line_trace_specs order: the scatter traces named after a compared year
+# and a line_series stat (bars and boxes reuse the names, bands do not)
+def line_trace_indices(figure, current_year, historical_year):
+    names = [f"{year} {temp_type}" for year in (current_year, historical_year) for temp_type, _, _ in line_series]
+    if isinstance(figure, dict):
+        traces = [(trace['type'], trace.get('name')) for trace in figure['data']]
+    else:
+        traces = [(trace.type, trace.name) for trace in figure.data]
+    positions = {}
+    for i, (trace_type, name) in enumerate(traces):
+        if trace_type in ('scatter', 'scattergl'):
+            positions.setdefault(name, i)
+    return [positions[name] for name in names]
+
+
+# Current year boxes are colored, historical ones grey
+def _box_year_styles(current_year, historical_year):
+    return [
+        (current_year, dict(
+            box_color='#4A90E2', opacity=0.85, show_legend=True,
+            avg_color=current_colors['Avg'], max_color=current_colors['Max'], min_color=current_colors['Min'])),
+        (historical_year, dict(
+            box_color='#888888', opacity=0.7, show_legend=False,
+            avg_color='white', max_color='#AAAAAA', min_color='#CCCCCC')),
+    ]
+
+
+# --- Monthly Box Plot Traces ---
+# Each month gets a box (stat 'box') plus Avg/Max/Min mean markers per year.
+# With precomputed=True each box carries only its q1/median/q3/fences from
+# the monthly aggregate table instead of every daily value. months limits
+# the boxes to some of box_months (to rebuild single months).
+@timed_stage('box_traces')
+def box_trace_specs(dataset, station, current_year, historical_year, visible=True, precomputed=False,
+                    months=None):
+    monthly_stats = dataset.monthly_aggregates(station)
+    year_styles = _box_year_styles(current_year, historical_year)
+    traces = []
+    for month in (box_months if months is None else months):
+        month_name = calendar.month_abbr[month]
+        for year, style in year_styles:
+            if (year, month) not in monthly_stats.index:
+                continue
+            stats = monthly_stats.loc[(year, month)]
+            month_max = stats['All max']
+            month_min = stats['All min']
+            month_avg = stats['All mean']
+            if precomputed:
+                box_data = dict(
+                    x=[month_name],
+                    q1=[stats['All q1']],
+                    median=[stats['All median']],
+                    q3=[stats['All q3']],
+                    lowerfence=[stats['All lowerfence']],
+                    upperfence=[stats['All upperfence']],
+                    customdata=[[month_max, month_min, month_avg]],
+                )
+            else:
+                month_df = dataset.month_frame(year, month, station)
+                combined_temps = pd.concat([
+                    month_df['Max Temp'],
+                    month_df['Min Temp'],
+                    month_df['Avg Temp']
+                ]).to_numpy()
+                box_data = dict(
+                    y=combined_temps,
+                    x=[month_name]*len(combined_temps),
+                    customdata=[[month_max, month_min, month_avg]] * len(combined_temps),
+                )
+            traces.append((dict(
+                type='box',
+                **box_data,
+                name=month_name if style['show_legend'] else None,
+                legendgroup=month_name,
+                showlegend=style['show_legend'],
+                marker=dict(color=style['box_color']),
+                line=dict(color=style['box_color']),
+                boxmean=False,
+                boxpoints=False,
+                hoveron='boxes',
+                visible=visible,
+                opacity=style['opacity'],
+                hoverinfo='skip',
+                hovertemplate=(
+                    '<b>%{x}</b><br>' +
+                    'Max: %{customdata[0]:.1f}°F<br>' +
+                    'Min: %{customdata[1]:.1f}°F<br>' +
+                    'Avg: %{customdata[2]:.1f}°F<br>' +
+                    '<extra></extra>'
+                )
+            ), {'view': 'Monthly Box Plot', 'year': year, 'stat': 'box', 'month': month}))
+            for key, label, value in [
+                ('avg', 'Avg', month_avg),
+                ('max', 'Max', stats['Max mean']),
+                ('min', 'Min', stats['Min mean']),
+            ]:
+                traces.append((dict(
+                    type='scatter',
+                    x=[month_name],
+                    y=[value],
+                    mode='lines',
+                    line=dict(color=style[f'{key}_color'], width=4),
+                    name=None,
+                    legendgroup=month_name,
+                    showlegend=False,
+                    visible=visible,
+                    hovertemplate='<b>%{x}</b><br>'+label+': %{y:.1f}°F<br><extra></extra>'
+                ), {'view': 'Monthly Box Plot', 'year': year, 'stat': label, 'month': month}))
+    return traces
+
+
+box_traces = _graph_objects(box_trace_specs)
+
+
+# --- Consolidated Monthly Box Plot Traces ---
+# Same boxes as box_traces, but one multi-category Box per year (each month
+# is a category of it) and one Avg/Max/Min mean marker trace per year, so the
+# view has 8 traces however many months are loaded. Months without data are
+# left out of the arrays rather than dropping traces.
+@timed_stage('box_traces')
+def consolidated_box_trace_specs(dataset, station, current_year, historical_year, visible=True,
+                                 precomputed=False):
+    monthly_stats = dataset.monthly_aggregates(station)
+    traces = []
+    for year, style in _box_year_styles(current_year, historical_year):
+        if year in monthly_stats.index.unique('year'):
+            stats = monthly_stats.loc[year]
+        else:
+            stats = monthly_stats.iloc[:0].droplevel('year')
+        stats = stats.loc[[month for month in box_months if month in stats.index]]
+        labels = [calendar.month_abbr[month] for month in stats.index]
+        hover_stats = stats[['All max', 'All min', 'All mean']].to_numpy()
+        if precomputed:
+            box_data = dict(
+                x=labels,
+                q1=stats['All q1'].to_numpy(),
+                median=stats['All median'].to_numpy(),
+                q3=stats['All q3'].to_numpy(),
+                lowerfence=stats['All lowerfence'].to_numpy(),
+                upperfence=stats['All upperfence'].to_numpy(),
+                customdata=hover_stats,
+            )
+        else:
+            values, x, customdata = [], [], []
+            for month, label, month_stats in zip(stats.index, labels, hover_stats):
+                month_df = dataset.month_frame(year, month, station)
+                combined_temps = np.concatenate([
+                    month_df['Max Temp'].to_numpy(),
+                    month_df['Min Temp'].to_numpy(),
+                    month_df['Avg Temp'].to_numpy(),
+                ])
+                values.append(combined_temps)
+                x += [label] * len(combined_temps)
+                customdata.append(np.repeat(month_stats[np.newaxis, :], len(combined_temps), axis=0))
+            box_data = dict(
+                y=np.concatenate(values) if values else [],
+                x=x,
+                customdata=np.concatenate(customdata) if customdata else [],
+            )
+        traces.append((dict(
+            type='box',
+            **box_data,
+            name=str(year),
+            legendgroup=f'box_{year}',
+            showlegend=True,
+            marker=dict(color=style['box_color']),
+            line=dict(color=style['box_color']),
+            boxmean=False,
+            boxpoints=False,
+            hoveron='boxes',
+            visible=visible,
+            opacity=style['opacity'],
+            hoverinfo='skip',
+            hovertemplate=(
+                '<b>%{x}</b><br>' +
+                'Max: %{customdata[0]:.1f}°F<br>' +
+                'Min: %{customdata[1]:.1f}°F<br>' +
+                'Avg: %{customdata[2]:.1f}°F<br>' +
+                '<extra></extra>'
+            )
+        ), {'view': 'Monthly Box Plot', 'year': year, 'stat': 'box'}))
+        for key, label, column in [
+            ('avg', 'Avg', 'All mean'),
+            ('max', 'Max', 'Max mean'),
+            ('min', 'Min', 'Min mean'),
+        ]:
+            # A horizontal tick per month, drawn at the center of its box
+            traces.append((dict(
+                type='scatter',
+                x=labels,
+                y=stats[column].to_numpy(),
+                mode='markers',
+                marker=dict(symbol='line-ew', size=18, line=dict(color=style[f'{key}_color'], width=4)),
+                name=f'{year} {label}',
+                legendgroup=f'box_{year}',
+                showlegend=False,
+                visible=visible,
+                hovertemplate='<b>%{x}</b><br>'+label+': %{y:.1f}°F<br><extra></extra>'
+            ), {'view': 'Monthly Box Plot', 'year': year, 'stat': label}))
+    return traces
+
+
+consolidated_box_traces = _graph_objects(consolidated_box_trace_specs)
+
+
+# --- Highlight Differences Bar Chart (all data, with bar text labels) ---
+@timed_stage('bar_traces')
+def highlight_trace_specs(dataset, station, current_year, historical_year, visible=True):
+    monthly_stats = dataset.monthly_aggregates(station)
+    highlight_month_names = [calendar.month_abbr[m] for m in highlight_months]
+
+    # Prepare data structure: {year: {stat: [per month values]}}
+    years = [current_year, historical_year]
+    vals = {year: {stat: [] for stat in bar_categories} for year in years}
+    text = {year: {stat: [] for stat in bar_categories} for year in years}
+    for m in highlight_months:
+        # Max bars show the monthly max of Max Temp, Min bars the monthly min of
+        # Min Temp and Avg bars the monthly mean of Avg Temp
+        for stat, agg in zip(bar_categories, ['Max max', 'Avg mean', 'Min min']):
+            for year in years:
+                if (year, m) in monthly_stats.index:
+                    val = monthly_stats.at[(year, m), agg]
+                    text[year][stat].append(f"{year} {stat}: {val:.1f}°F")
+                else:
+                    val = float('nan')
+                    text[year][stat].append("")
+                vals[year][stat].append(val)
+
+    # Add bars: for each stat/year
+    traces = []
+    for stat in bar_categories:
+        for year, colors, opacity in [
+            (current_year, bar_colors_current, 0.9),
+            (historical_year, bar_colors_historical, 0.7),
+        ]:
+            traces.append((dict(
+                type='bar',
+                x=highlight_month_names,
+                y=vals[year][stat],
+                name=f'{year} {stat}',
+                marker=dict(color=colors[stat]),
+                opacity=opacity,
+                showlegend=True,
+                visible=visible,
+                legendgroup=f'highlight_{stat}',
+                hovertemplate=f'{year} '+stat+'<br>%{x}: %{y:.1f}°F<extra></extra>',
+                text=text[year][stat],
+                textposition='auto',
+            ), {'view': 'Highlight Differences', 'year': year, 'stat': stat}))
+    return traces
+
+
+highlight_traces = _graph_objects(highlight_trace_specs)
+
+
+# --- Climatology Bands ---
+# The line view's "normal range": percentiles of band_column on each day of
+# the year across a baseline window of years
+band_column = 'Avg Temp'
+
+
+# 'START-END' (e.g. '1991-2020', or a single year) as a (start, end) window
+def parse_baseline(text):
+    start, _, end = text.strip().partition('-')
+    baseline = (int(start), int(end or start))
+    if baseline[0] > baseline[1]:
+        raise ValueError(f"Baseline {text!r} ends before it starts")
+    return baseline
+
+
+# p10-p90 and p25-p75 bands (closed polygons) and the median of column
+# across the baseline (start, end) years, from the dataset's cached
+# climatology. They go before the line traces so the compared years draw
+# over them; days no baseline year has are skipped, and Feb 29 when
+# current_year has none.
+@timed_stage('band_traces')
+def climatology_band_trace_specs(dataset, station, current_year, historical_year, baseline, visible=True,
+                                 column=band_column):
+    p10, p25, median, p75, p90 = dataset.climatology(baseline, column, station)
+    dates = pd.date_range(f'{current_year}-01-01', f'{current_year}-12-31').to_numpy()
+    columns = np.arange(len(median))
+    if not calendar.isleap(current_year):
+        columns = np.delete(columns, LEAP_DAY_COLUMN)
+    keep = ~np.isnan(median[columns])
+    x, columns = dates[keep], columns[keep]
+    label = column.split()[0]
+    window = f'{baseline[0]}–{baseline[1]}'
+
+    def band(lower, upper, name, alpha, group_title=None):
+        return dict(
+            type='scatter',
+            x=np.concatenate([x, x[::-1]]),
+            y=np.concatenate([lower[columns], upper[columns][::-1]]),
+            mode='none',
+            fill='toself',
+            fillcolor=rgba(current_colors[label], alpha),
+            name=name,
+            legendgroup='climatology',
+            legendgrouptitle=dict(text=group_title) if group_title else None,
+            hoverinfo='skip',
+            showlegend=True,
+            visible=visible
+        )
+
+    return [
+        (band(p10, p90, 'p10–p90', 0.12, group_title=f'Normal {label} {window}'),
+         {'view': 'Line Plot', 'stat': 'p10-p90'}),
+        (band(p25, p75, 'p25–p75', 0.2), {'view': 'Line Plot', 'stat': 'p25-p75'}),
+        (dict(
+            type='scatter',
+            x=x,
+            y=median[columns],
+            mode='lines',
+            line=dict(color=current_colors[label], width=1, dash='dash'),
+            name='Median',
+            legendgroup='climatology',
+            customdata=np.column_stack([p10, p25, p75, p90])[columns],
+            hovertemplate=(
+                '%{x|%b %d}<br>Normal '+label+' '+window+': %{y:.1f}°F<br>' +
+                'p25–p75: %{customdata[1]:.1f}–%{customdata[2]:.1f}°F<br>' +
+                'p10–p90: %{customdata[0]:.1f}–%{customdata[3]:.1f}°F<extra></extra>'
+            ),
+            showlegend=True,
+            visible=visible
+        ), {'view': 'Line Plot', 'stat': 'median'}),
+    ]
+
+
+climatology_band_traces = _graph_objects(climatology_band_trace_specs)
+
+
+# --- Calendar Heatmap Traces ---
+# Colorscales of the heatmaps (plotly.js maps each cell's value onto them):
+# sequential for temperatures, diverging around 0 for differences
+heatmap_column = 'Avg Temp'
+temperature_colorscale = [[0.0, '#4A90E2'], [0.5, '#F7E8A4'], [1.0, '#E4572E']]
+difference_colorscale = [[0.0, '#4A90E2'], [0.5, '#FFFFFF'], [1.0, '#E4572E']]
+
+# The view stacks the difference strip (on yaxis2) above the year x day
+# matrix (on yaxis); the view buttons switch these domains
+heatmap_domain = [0, 0.82]
+difference_domain = [0.88, 1]
+
+
+def difference_yaxis(visible=True):
+    return dict(domain=difference_domain, anchor='x', showgrid=False, fixedrange=True, visible=visible)
+
+
+# Rows (loaded years) and columns (dates) of the year x day matrix of
+# column, in current_year's calendar so the view shares the line view's date
+# axis; when current_year has no Feb 29, other years' Feb 29 readings are
+# left out
+def _calendar_matrix(dataset, station, current_year, column):
+    years, matrix = dataset.day_of_year_matrix(column, station)
+    if not calendar.isleap(current_year):
+        matrix = np.delete(matrix, LEAP_DAY_COLUMN, axis=1)
+    dates = pd.date_range(f'{current_year}-01-01', f'{current_year}-12-31').to_numpy()
+    return years, matrix, dates
+
+
+# Index of the difference strip in figure (a go.Figure or a figure dict):
+# the only trace on the y2 axis
+def difference_trace_index(figure):
+    if isinstance(figure, dict):
+        return next(i for i, trace in enumerate(figure['data']) if trace.get('yaxis') == 'y2')
+    return next(i for i, trace in enumerate(figure.data) if getattr(trace, 'yaxis', None) == 'y2')
+
+
+# One-row heatmap of the first minus the second of difference_years (any two
+# loaded years; a year without data gives an empty row)
+def difference_heatmap_trace_spec(dataset, station, current_year, difference_years, visible=True,
+                                  column=heatmap_column):
+    years, matrix, dates = _calendar_matrix(dataset, station, current_year, column)
+    rows = {year: row for row, year in enumerate(years)}
+    missing = np.full(matrix.shape[1], np.nan)
+    first, second = difference_years
+    difference = (matrix[rows[first]] if first in rows else missing) \
+        - (matrix[rows[second]] if second in rows else missing)
+    label = column.split()[0]
+    return dict(
+        type='heatmap',
+        x=dates,
+        y=[f'{first} − {second}'],
+        z=difference[np.newaxis, :],
+        yaxis='y2',
+        colorscale=difference_colorscale,
+        zmid=0,
+        colorbar=dict(title=dict(text='Δ°F'), y=difference_domain[1], yanchor='top',
+                      len=difference_domain[1] - difference_domain[0]),
+        name=f'{first} − {second}',
+        hovertemplate=f'%{{x|%b %d}}<br>{first} vs {second} {label}: '+'%{z:+.1f}°F<extra></extra>',
+        visible=visible
+    )
+
+
+# Every day of every loaded year as one heatmap (a row per year, a column
+# per day of heatmap_column), plus the difference strip of difference_years
+# (default: current_year minus historical_year). Both come from the
+# dataset's cached day-of-year matrix.
+@timed_stage('heatmap_traces')
+def calendar_heatmap_trace_specs(dataset, station, current_year, historical_year, visible=True,
+                                 column=heatmap_column, difference_years=None):
+    years, matrix, dates = _calendar_matrix(dataset, station, current_year, column)
+    label = column.split()[0]
+    return [
+        (dict(
+            type='heatmap',
+            x=dates,
+            y=[str(year) for year in years],
+            z=matrix,
+            colorscale=temperature_colorscale,
+            colorbar=dict(title=dict(text='°F'), y=heatmap_domain[0], yanchor='bottom',
+                          len=heatmap_domain[1] - heatmap_domain[0]),
+            name=f'{label} Temperature',
+            hovertemplate='%{x|%b %d}, %{y}<br>'+label+': %{z:.1f}°F<extra></extra>',
+            visible=visible
+        ), {'view': 'Calendar Heatmap', 'stat': 'heatmap'}),
+        (difference_heatmap_trace_spec(
+            dataset, station, current_year, difference_years or (current_year, historical_year),
+            visible=visible, column=column,
+        ), {'view': 'Calendar Heatmap', 'stat': 'difference'}),
+    ]
+
+
+calendar_heatmap_traces = _graph_objects(calendar_heatmap_trace_specs)
+
+
+# Invisible dummy traces for each month to pin all months on the x-axis
+# (with out-of-range y-values); they belong to no view
+def month_pin_trace_specs():
+    return [
+        (dict(
+            type='scatter',
+            x=[month],
+            y=[-9999],
+            mode='markers',
+            marker=dict(opacity=0),
+            showlegend=False,
+            hoverinfo='skip',
+            visible=True
+        ), {'view': None, 'stat': 'pin'})
+        for month in ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    ]
+
+
+month_pin_traces = _graph_objects(month_pin_trace_specs)
+
+
+# Temperature range the month shading covers: the compared years' monthly
+# extremes (those of every loaded year when neither has monthly rows)
+def _shading_range(dataset, station, current_year, historical_year):
+    table = dataset.monthly_aggregates(station)
+    loaded = table.index.unique('year')
+    years = [year for year in (current_year, historical_year) if year in loaded]
+    compared_stats = table.loc[years] if years else table
+    return compared_stats['Min min'].min(), compared_stats['Max max'].max()
+
+
+# [start, end) of each even month of year as ISO date strings
+def _even_months(year):
+    for month in range(2, 13, 2):
+        start = pd.Timestamp(f"{year}-{month:02d}-01")
+        yield start.strftime('%Y-%m-%d'), (start + pd.offsets.MonthBegin(1)).strftime('%Y-%m-%d')
+
+
+# Alternate month shading for clarity (date axis), as layout shapes
+@timed_stage('layout')
+def month_shading_shapes(dataset, station, current_year, historical_year):
+    min_temp, max_temp = _shading_range(dataset, station, current_year, historical_year)
+    shapes = []
+    for start, end in _even_months(current_year):  # Shade only even months
+        shapes.append(dict(
+            type="rect",
+            x0=start,
+            x1=end,
+            y0=min_temp - 2,
+            y1=max_temp + 2,
+            fillcolor="rgba(200,200,200,0.15)",
+            layer="below",
+            line=dict(width=0),
+        ))
+    return shapes
+
+
+def add_month_shading(fig, dataset, station, current_year, historical_year):
+    for shape in month_shading_shapes(dataset, station, current_year, historical_year):
+        fig.add_shape(shape)
+
+
+# The same shading as one filled trace of the line view (the even-month
+# rectangles as closed polygons separated by gaps) instead of six shapes;
+# it goes first so the lines draw over it
+def month_shading_trace_specs(dataset, station, current_year, historical_year, visible=True):
+    min_temp, max_temp = _shading_range(dataset, station, current_year, historical_year)
+    y0, y1 = min_temp - 2, max_temp + 2
+    x, y = [], []
+    for x0, x1 in _even_months(current_year):
+        x += [x0, x1, x1, x0, x0, None]
+        y += [y0, y0, y1, y1, y0, None]
+    return [(dict(
+        type='scatter',
+        x=x,
+        y=y,
+        mode='none',
+        fill='toself',
+        fillcolor="rgba(200,200,200,0.15)",
+        showlegend=False,
+        hoverinfo='skip',
+        visible=visible
+    ), {'view': 'Line Plot', 'stat': 'shading'})]
+
+
+month_shading_traces = _graph_objects(month_shading_trace_specs)
+
+
+# Axis, legend and background styling shared by every figure, as layout
+# properties
+@timed_stage('layout')
+def base_layout(current_year):
+    return dict(
+        xaxis=dict(
+            gridwidth=1,
+            gridcolor='rgba(0, 0, 0, 0.1)',
+            tickformat='%b',  # Only show month abbreviation
+            tickfont=dict(size=8),  # Even smaller font
+            tickangle=45,  # Slightly less steep for readability
+            tickmode='array',
+            tickvals=[pd.Timestamp(f'{current_year}-{month:02d}-01') for month in range(1, 13)],
+        ),
+        yaxis=dict(
+            gridwidth=1,
+            gridcolor='rgba(0, 0, 0, 0.1)'
+        ),
+        # --- Enhanced legend appearance (keep this only, but do NOT increase line width for legend) ---
+        legend=dict(
+            yanchor="top",
+            y=0.99,
+            xanchor="left",
+            x=1.05,
+            bgcolor='rgba(255, 255, 255, 0.95)',
+            bordercolor='rgba(0, 0, 0, 0.3)',
+            borderwidth=1,
+            font=dict(size=15),
+            tracegroupgap=30,
+            itemsizing='constant',
+            title=dict(font=dict(size=16)),
+            itemwidth=40,
+            itemclick='toggleothers',
+            itemdoubleclick='toggle',
+            traceorder='grouped',
+        ),
+        # --- Layout polish: white background ---
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        margin=dict(t=40),
+    )
+
+
+def apply_base_layout(fig, current_year):
+    fig.update_layout(base_layout(current_year))
+
+
+# Horizontal tab-style buttons switching between the views; masks maps each
+# view to its trace visibility list
+def view_updatemenus(masks, consolidated=False):
+    return [
+        dict(
+            buttons=[
+                dict(
+                    label=view,
+                    method='update',
+                    args=[
+                        {'visible': masks[view]},
+                        {'xaxis': view_xaxis(view, consolidated),
+                         'yaxis.domain': heatmap_domain if view == 'Calendar Heatmap' else [0, 1],
+                         'yaxis.type': view_yaxis_type(view),
+                         'yaxis2.visible': view == 'Calendar Heatmap',
+                         'annotations': []}
+                    ],
+                )
+                for view in VIEWS
+            ],
+            direction='right',  # Horizontal row
+            showactive=True,
+            x=0.5,
+            xanchor='center',
+            y=1.06,
+            yanchor='top',
+            bordercolor="#888",
+            bgcolor="#f6f6f6",
+            borderwidth=1,
+            font=dict(size=16, family="Arial"),
+            pad=dict(r=10, t=10, b=10, l=10),
+            type='buttons',
+        ),
+    ]
+
+
+# All views in one figure, switched client-side by updatemenus buttons
+# that toggle trace visibility (used for the standalone HTML export)
+def build_combined_figure(dataset, station, current_year, historical_year,
+                          max_points=None, downsample_method='lttb', precomputed_boxes=False,
+                          consolidated_boxes=False, baseline=None, difference_years=None):
+    fig, _ = combined_figure_with_registry(
+        dataset, station, current_year, historical_year,
+        max_points=max_points, downsample_method=downsample_method, precomputed_boxes=precomputed_boxes,
+        consolidated_boxes=consolidated_boxes, baseline=baseline,
+        difference_years=difference_years)
+    return fig
+
+
+# (trace entries, layout dict) of the combined figure, with every trace's
+# visibility set for DEFAULT_VIEW.
+# consolidated_boxes=True draws the box view with consolidated_box_traces and
+# the month shading as a trace, and pins the months with categoryarray
+# instead of dummy traces, so the trace count no longer grows with months.
+# baseline, a (start, end) window of years, adds the climatology bands to
+# the line view; difference_years picks the pair of years of the calendar
+# heatmap's difference strip
+def combined_figure_specs(dataset, station, current_year, historical_year,
+                          max_points=None, downsample_method='lttb', precomputed_boxes=False,
+                          consolidated_boxes=False, baseline=None, difference_years=None):
+    args = (dataset, station, current_year, historical_year)
+    lines = line_trace_specs(*args, visible=True, max_points=max_points, downsample_method=downsample_method)
+    if baseline is not None:
+        lines = climatology_band_trace_specs(*args, baseline) + lines
+    highlights = highlight_trace_specs(*args, visible=False)
+    heatmaps = calendar_heatmap_trace_specs(*args, visible=False, difference_years=difference_years)
+    if consolidated_boxes:
+        entries = (
+            month_shading_trace_specs(*args, visible=True)
+            + lines
+            + consolidated_box_trace_specs(*args, visible=False, precomputed=precomputed_boxes)
+            + highlights
+            + heatmaps
+        )
+        layout = {}
+    else:
+        entries = (
+            lines
+            + box_trace_specs(*args, visible=False, precomputed=precomputed_boxes)
+            + highlights
+            + heatmaps
+            + month_pin_trace_specs()
+        )
+        layout = {'shapes': month_shading_shapes(*args)}
+    layout.update(base_layout(current_year))
+    layout['yaxis2'] = difference_yaxis(visible=DEFAULT_VIEW == 'Calendar Heatmap')
+    layout['yaxis']['type'] = view_yaxis_type(DEFAULT_VIEW)
+
+    registry = TraceRegistry()
+    registry.add_all(entries)
+    masks = {view: registry.visibility(view) for view in VIEWS}
+    layout['updatemenus'] = view_updatemenus(masks, consolidated_boxes)
+
+    # Set default: show line plot traces only
+    for (spec, _), visible in zip(entries, masks[DEFAULT_VIEW]):
+        spec['visible'] = visible
+    return entries, layout
+
+
+# build_combined_figure() plus the TraceRegistry describing its traces, for
+# callers that patch the figure later (see incremental_updates.py)
+def combined_figure_with_registry(dataset, station, current_year, historical_year,
+                                  max_points=None, downsample_method='lttb', precomputed_boxes=False,
+                                  consolidated_boxes=False, baseline=None, difference_years=None):
+    entries, layout = combined_figure_specs(
+        dataset, station, current_year, historical_year,
+        max_points=max_points, downsample_method=downsample_method, precomputed_boxes=precomputed_boxes,
+        consolidated_boxes=consolidated_boxes, baseline=baseline,
+        difference_years=difference_years)
+    fig = go.Figure()
+    registry = TraceRegistry(fig)
+    registry.add_all([(graph_object_trace(spec), tags) for spec, tags in entries])
+    fig.update_layout(layout)
+    return fig, registry
+
+
+# (trace entries, layout dict) of a figure holding only one view's traces
+def view_figure_specs(view, dataset, station, current_year, historical_year,
+                      max_points=None, downsample_method='lttb', x_range=None,
+                      precomputed_boxes=False, consolidated_boxes=False, baseline=None,
+                      difference_years=None):
+    args = (dataset, station, current_year, historical_year)
+    if view == 'Line Plot':
+        lines = line_trace_specs(*args, max_points=max_points, downsample_method=downsample_method,
+                                 x_range=x_range)
+        if baseline is not None:
+            lines = climatology_band_trace_specs(*args, baseline) + lines
+        if consolidated_boxes:
+            entries, layout = month_shading_trace_specs(*args) + lines, {}
+        else:
+            entries, layout = lines, {'shapes': month_shading_shapes(*args)}
+        layout.update(base_layout(current_year))
+        if x_range is not None:
+            layout['xaxis']['range'] = list(x_range)
+    elif view in ('Monthly Box Plot', 'Highlight Differences'):
+        if view == 'Highlight Differences':
+            entries = highlight_trace_specs(*args)
+        elif consolidated_boxes:
+            entries = consolidated_box_trace_specs(*args, precomputed=precomputed_boxes)
+        else:
+            entries = box_trace_specs(*args, precomputed=precomputed_boxes)
+        # In the layout (unlike in button args) plotly stores the title as {'text': ...}
+        xaxis = view_xaxis(view, consolidated_boxes)
+        xaxis['title'] = dict(text=xaxis['title'])
+        layout = dict(base_layout(current_year), xaxis=xaxis)
+    elif view == 'Calendar Heatmap':
+        entries = calendar_heatmap_trace_specs(*args, difference_years=difference_years)
+        layout = dict(base_layout(current_year), yaxis2=difference_yaxis())
+        layout['yaxis']['domain'] = heatmap_domain
+        layout['yaxis']['type'] = view_yaxis_type(view)
+    else:
+        raise ValueError(f"Unknown view {view!r}; expected one of {VIEWS}")
+    return entries, layout
+
+
+# A figure holding only one view's traces, for building views on demand.
+# max_points/downsample_method/x_range apply to the line view (x_range also
+# keeps the zoomed window as the visible axis range) and so does baseline
+# (the climatology bands), precomputed_boxes and consolidated_boxes (see
+# combined_figure_specs) to the box view, difference_years to the calendar
+# heatmap
+def build_view_figure(view, dataset, station, current_year, historical_year,
+                      max_points=None, downsample_method='lttb', x_range=None,
+                      precomputed_boxes=False, consolidated_boxes=False, baseline=None,
+                      difference_years=None):
+    entries, layout = view_figure_specs(
+        view, dataset, station, current_year, historical_year,
+        max_points=max_points, downsample_method=downsample_method, x_range=x_range,
+        precomputed_boxes=precomputed_boxes, consolidated_boxes=consolidated_boxes, baseline=baseline,
+        difference_years=difference_years)
+    fig = go.Figure()
+    fig.add_traces([graph_object_trace(spec) for spec, _ in entries])
+    fig.update_layout(layout)
+    return fig
@@ -0,0 +1,163 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from temperature_data import DEFAULT_CHUNK_ROWS, TEMP_COLUMNS, iter_csv_chunks
+
+AGG_KEYS = ['station', 'year', 'month']
+
+
+# Box-plot statistics for many groups at once, computed the way plotly.js
+# does for raw box data (so precomputed boxes look identical): quartiles use
+# its "linear" method (position p*n - 0.5, i.e. NumPy's "hazen"), and the
+# fences are the furthest data points within 1.5 IQR of the box.
+# codes are group numbers 0..n_groups-1, one per value.
+# Returns a dict of arrays of length n_groups (NaN for empty groups).
+def grouped_box_stats(codes, values, n_groups):
+    codes = np.asarray(codes, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    empty = counts == 0
+    last = max(len(values) - 1, 0)
+    padded = values if len(values) else np.array([np.nan])
+
+    def quantile(p):
+        pos = np.clip(p * counts - 0.5, 0, np.maximum(counts - 1, 0))
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        frac = pos - lo
+        result = (padded[np.minimum(starts + lo, last)] * (1 - frac)
+                  + padded[np.minimum(starts + hi, last)] * frac)
+        return np.where(empty, np.nan, result)
+
+    q1 = quantile(0.25)
+    median = quantile(0.5)
+    q3 = quantile(0.75)
+    iqr = q3 - q1
+
+    lower = np.full(n_groups, np.inf)
+    np.minimum.at(lower, codes, np.where(values >= (q1 - 1.5 * iqr)[codes], values, np.inf))
+    upper = np.full(n_groups, -np.inf)
+    np.maximum.at(upper, codes, np.where(values <= (q3 + 1.5 * iqr)[codes], values, -np.inf))
+    return {
+        'q1': q1,
+        'median': median,
+        'q3': q3,
+        'lowerfence': np.where(empty, np.nan, np.minimum(q1, lower)),
+        'upperfence': np.where(empty, np.nan, np.maximum(q3, upper)),
+    }
+
+
+# One row per (station, year, month) with every statistic the figures use:
+# max/min/mean/count of each temperature column ("Max max", "Avg mean", ...)
+# and max/min/mean/quartiles/fences of the three columns pooled together
+# ("All q1", "All lowerfence", ...), which is what the monthly box plot
+# summarizes.
+# data is the long frame of TemperatureDataset (station/year/month index
+# levels); everything is computed in a single groupby pass per table.
+def monthly_aggregates(data):
+    temps = data[TEMP_COLUMNS].astype('float64')
+    keys = [temps.index.get_level_values(level) for level in AGG_KEYS]
+    table = temps.groupby(keys).agg(['max', 'min', 'mean', 'count'])
+    table.columns = [f"{col.split()[0]} {stat}" for col, stat in table.columns]
+
+    pooled = temps.stack()
+    pooled_keys = [pooled.index.get_level_values(level) for level in AGG_KEYS]
+    pooled_groups = pooled.groupby(pooled_keys)
+    table['All max'] = pooled_groups.max()
+    table['All min'] = pooled_groups.min()
+    table['All mean'] = pooled_groups.mean()
+    # ngroup() numbers groups in the same sorted order as the table rows
+    box_stats = grouped_box_stats(pooled_groups.ngroup().to_numpy(), pooled.to_numpy(), len(table))
+    for stat, values in box_stats.items():
+        table[f'All {stat}'] = values
+    table.index.names = AGG_KEYS
+    return table
+
+
+# Column of each (month, day) in a leap-year calendar: every date keeps the
+# same column in every year, and Feb 29 has its own
+DAYS_IN_YEAR = 366
+LEAP_DAY_COLUMN = 59
+_MONTH_OFFSETS = np.cumsum([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+
+
+# One column of a station's daily readings as a (years x 366) matrix by
+# leap-year day of year, NaN where a day has no reading (a repeated reading
+# overwrites the earlier one). data is the long frame of one station
+# (year/month/day index levels). Returns (years, matrix).
+def day_of_year_matrix(data, column):
+    index = data.index
+    years, rows = np.unique(index.get_level_values('year').to_numpy(), return_inverse=True)
+    columns = (_MONTH_OFFSETS[index.get_level_values('month').to_numpy() - 1]
+               + index.get_level_values('day').to_numpy() - 1)
+    matrix = np.full((len(years), DAYS_IN_YEAR), np.nan)
+    matrix[rows, columns] = data[column].to_numpy(dtype=np.float64)
+    return years, matrix
+
+
+# Percentiles of the climatology bands ("normal range" of each day)
+CLIMATOLOGY_PERCENTILES = [10, 25, 50, 75, 90]
+
+
+# Percentiles of each day-of-year column of a (years x 366) matrix, across
+# the years that have the day: a (len(percentiles) x 366) array, NaN for
+# days no year has
+def day_of_year_percentiles(matrix, percentiles=CLIMATOLOGY_PERCENTILES):
+    if not len(matrix):
+        return np.full((len(percentiles), matrix.shape[1]), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN columns
+        return np.nanpercentile(matrix, percentiles, axis=0)
+
+
+def _long_frame(chunk, station):
+    dates = chunk['Date']
+    index = pd.MultiIndex.from_arrays(
+        [np.full(len(chunk), station, dtype=object), dates.dt.year, dates.dt.month, dates.dt.day],
+        names=AGG_KEYS + ['day'],
+    )
+    return pd.DataFrame({col: chunk[col].to_numpy() for col in TEMP_COLUMNS}, index=index)
+
+
+# monthly_aggregates() for CSVs too large to load whole: the files of one
+# station are read in chunks (see temperature_data.iter_csv_chunks) and each
+# month is aggregated as soon as the stream has moved past it, so only one
+# chunk plus the rows of the current month are held at a time. Rows must be
+# in date order (across files too); the result matches monthly_aggregates()
+# on the same data.
+def streaming_monthly_aggregates(filenames, station, chunksize=DEFAULT_CHUNK_ROWS):
+    if isinstance(filenames, (str, bytes)) or hasattr(filenames, '__fspath__'):
+        filenames = [filenames]
+    tables = []
+    pending = None
+    last_key = None
+    for filename in filenames:
+        for chunk in iter_csv_chunks(filename, chunksize=chunksize):
+            chunk = chunk.dropna(subset=['Date'])
+            if chunk.empty:
+                continue
+            keys = chunk['Date'].dt.year.to_numpy() * 12 + chunk['Date'].dt.month.to_numpy()
+            if np.any(np.diff(keys) < 0) or (last_key is not None and keys[0] < last_key):
+                raise ValueError(f"{filename}: rows are not in date order; use monthly_aggregates() instead")
+            last_key = keys[-1]
+            frame = _long_frame(chunk, station)
+            if pending is not None:
+                frame = pd.concat([pending, frame])
+                keys = np.concatenate([pending_keys, keys])
+            # Everything before the newest month is complete
+            done = keys < keys[-1]
+            if done.any():
+                tables.append(monthly_aggregates(frame[done]))
+            pending, pending_keys = frame[~done], keys[~done]
+    if pending is not None and len(pending):
+        tables.append(monthly_aggregates(pending))
+    if not tables:
+        raise ValueError(f"No rows read from {[str(f) for f in filenames]}")
+    return pd.concat(tables)
@@ -1,428 +1,254 @@
-import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import numpy as np
-from datetime import datetime
-import calendar
-from plotly.colors import hex_to_rgb, find_intermediate_color
 import base64
+import logging
+import os
 from pathlib import Path
 
-# Helper function to load and standardize a month's data
-def load_and_standardize_csv(filename):
-    df = pd.read_csv(filename)
-    df['Date'] = pd.to_datetime(df['Date'])
-    df = df.rename(columns={
-        'Max Temperature': 'Max Temp',
-        'Min Temperature': 'Min Temp',
-        'Avg Temperature': 'Avg Temp'
-    })
-    return df
-
-# List of months for file naming
-months = [
-    'january', 'february', 'march', 'april', 'may', 'june',
-    'july', 'august', 'september', 'october', 'november', 'december'
-]
-
-# Load and concatenate 2024 data
-current_year = 2024
-current_dfs = []
-for month in months:
-    fname = f"{month}_{current_year}_temperature_data.csv"
-    df = load_and_standardize_csv(fname)
-    current_dfs.append(df)
-df_2024 = pd.concat(current_dfs, ignore_index=True)
-
-# Load and concatenate 1990 data
-historical_year = 1990
-historical_dfs = []
-for month in months:
-    fname = f"{month}_{historical_year}_temperature_data.csv"
-    df = load_and_standardize_csv(fname)
-    historical_dfs.append(df)
-df_1990 = pd.concat(historical_dfs, ignore_index=True)
-
-# Create a shifted copy of df_1990 for line plots
-df_1990_line = df_1990.copy()
-df_1990_line['Date'] = df_1990_line['Date'].apply(lambda x: x.replace(year=2024))
-
-# Create a subplot figure
-fig = go.Figure()
-
-# Color and style definitions
-def rgba(hex_color, alpha):
-    rgb = hex_to_rgb(hex_color)
-    return f'rgba({rgb[0]},{rgb[1]},{rgb[2]},{alpha})'
-
-current_colors = {
-    'Max': '#4A90E2',
-    'Min': '#66BB6A',
-    'Avg': '#AB47BC',
-}
-historical_colors = {
-    'Max': '#73A3B3',
-    'Min': '#A8BFA8',
-    'Avg': '#C3A6C7',
-}
+# Importing this module is cheap: data loading, figure building and the
+# Dash/plotly imports only happen inside the functions below.
+# CSV loading (with the on-disk .npz cache) lives in temperature_data.py,
+# discovery in temperature_dataset.py and trace construction for every view
+# in temperature_figures.py.
+from instrumentation import recorder, stage
+
+# The two years being compared
+CURRENT_YEAR = 2024
+HISTORICAL_YEAR = 1990
 
-# --- Enhanced Line Plot Traces (visible by default) ---
-# We'll keep track of trace indices for toggling
-trace_indices = {
-    'line': {'Max': [], 'Avg': [], 'Min': []},
-    'box': {'Max': [], 'Avg': [], 'Min': []}
+EXPORT_PATH = "final-temperature-visualization.html"
+
+# Configure HTML export
+HTML_CONFIG = {
+    'scrollZoom': True,
+    'displayModeBar': True,
+    'responsive': True
 }
 
-# Add current year (2024) traces
-for i, (temp_type, col, group) in enumerate([
-    ('Max', 'Max Temp', 'Maximum Temperature'),
-    ('Avg', 'Avg Temp', 'Average Temperature'),
-    ('Min', 'Min Temp', 'Minimum Temperature')
-]):
-    idx = len(fig.data)
-    trace_indices['line'][temp_type].append(idx)
-    fig.add_trace(go.Scatter(
-        x=df_2024['Date'],
-        y=df_2024[col],
-        name=f"2024 {temp_type}",
-        mode='lines+markers',
-        marker=dict(size=2),
-        line=dict(color=current_colors[temp_type], width=1),
-        legendgroup=group,
-        legendgrouptitle_text=group,  # Only first trace in group will show group title
-        hovertemplate='%{x|%b %d, %Y}<br>'+temp_type+': %{y}°F<extra></extra>',
-        showlegend=True,
-        visible=True
-    ))
-
-# Add historical year (1990) traces
-for i, (temp_type, col, group) in enumerate([
-    ('Max', 'Max Temp', 'Maximum Temperature'),
-    ('Avg', 'Avg Temp', 'Average Temperature'),
-    ('Min', 'Min Temp', 'Minimum Temperature')
-]):
-    idx = len(fig.data)
-    trace_indices['line'][temp_type].append(idx)
-    fig.add_trace(go.Scatter(
-        x=df_1990_line['Date'],
-        y=df_1990_line[col],
-        name=f"1990 {temp_type}",
-        mode='lines+markers',
-        marker=dict(size=1.5),
-        line=dict(color=historical_colors[temp_type], width=1, dash='dot'),
-        legendgroup=group,
-        customdata=df_1990['Date'].dt.strftime('%b %d, %Y'),
-        hovertemplate='%{customdata}<br>'+temp_type+': %{y}°F<extra></extra>',
-        showlegend=True,
-        visible=True
-    ))
-
-# --- Monthly Box Plot Traces (hidden by default, new design) ---
-import calendar
-
-def interpolate_color(val, vmin, vmax, color1, color2):
-    # val in [vmin, vmax] mapped between color1 and color2
-    frac = (val - vmin) / (vmax - vmin) if vmax > vmin else 0.5
-    return find_intermediate_color(color1, color2, frac, colortype='rgb')
-
-monthly_box_indices_2024 = []
-monthly_max_indices_2024 = []
-monthly_min_indices_2024 = []
-monthly_avg_indices_2024 = []
-monthly_box_indices_1990 = []
-monthly_max_indices_1990 = []
-monthly_min_indices_1990 = []
-monthly_avg_indices_1990 = []
-box_months = list(range(1, 13))
-
-min_temp = min(df_2024['Min Temp'].min(), df_1990['Min Temp'].min())
-max_temp = max(df_2024['Max Temp'].max(), df_1990['Max Temp'].max())
-
-for month in box_months:
-    month_name = calendar.month_abbr[month]
-    # 2024 data
-    month_df_2024 = df_2024[(df_2024['Date'].dt.month == month) & (df_2024['Date'].dt.year == 2024)]
-    if not month_df_2024.empty:
-        combined_temps_2024 = pd.concat([
-            month_df_2024['Max Temp'],
-            month_df_2024['Min Temp'],
-            month_df_2024['Avg Temp']
-        ])
-        month_max = combined_temps_2024.max()
-        month_min = combined_temps_2024.min()
-        month_avg = combined_temps_2024.mean()
-        fig.add_trace(go.Box(
-            y=combined_temps_2024,
-            x=[month_name]*len(combined_temps_2024),
-            name=month_name,
-            legendgroup=month_name,
-            showlegend=True,
-            marker_color='#4A90E2',
-            line_color='#4A90E2',
-            boxmean=False,
-            boxpoints=False,
-            hoveron='boxes',
-            visible=False,
-            opacity=0.85,
-            customdata=[[month_max, month_min, month_avg]] * len(combined_temps_2024),
-            hoverinfo='skip',
-            hovertemplate=(
-                '<b>%{x}</b><br>' +
-                'Max: %{customdata[0]:.1f}°F<br>' +
-                'Min: %{customdata[1]:.1f}°F<br>' +
-                'Avg: %{customdata[2]:.1f}°F<br>' +
-                '<extra></extra>'
-            )
-        ))
-        monthly_box_indices_2024.append(len(fig.data) - 1)
-        fig.add_trace(go.Scatter(
-            x=[month_name],
-            y=[month_avg],
-            mode='lines',
-            line=dict(color=current_colors['Avg'], width=4),
-            name=None,
-            legendgroup=month_name,
-            showlegend=False,
-            visible=False,
-            hovertemplate='<b>%{x}</b><br>Avg: %{y:.1f}°F<br><extra></extra>'
-        ))
-        monthly_avg_indices_2024.append(len(fig.data) - 1)
-        fig.add_trace(go.Scatter(
-            x=[month_name],
-            y=[month_df_2024['Max Temp'].mean()],
-            mode='lines',
-            line=dict(color=current_colors['Max'], width=4),
-            name=None,
-            legendgroup=month_name,
-            showlegend=False,
-            visible=False,
-            hovertemplate='<b>%{x}</b><br>Max: %{y:.1f}°F<br><extra></extra>'
-        ))
-        monthly_max_indices_2024.append(len(fig.data) - 1)
-        fig.add_trace(go.Scatter(
-            x=[month_name],
-            y=[month_df_2024['Min Temp'].mean()],
-            mode='lines',
-            line=dict(color=current_colors['Min'], width=4),
-            name=None,
-            legendgroup=month_name,
-            showlegend=False,
-            visible=False,
-            hovertemplate='<b>%{x}</b><br>Min: %{y:.1f}°F<br><extra></extra>'
-        ))
-        monthly_min_indices_2024.append(len(fig.data) - 1)
-    # 1990 data
-    month_df_1990 = df_1990[(df_1990['Date'].dt.month == month) & (df_1990['Date'].dt.year == 1990)]
-    if not month_df_1990.empty:
-        combined_temps_1990 = pd.concat([
-            month_df_1990['Max Temp'],
-            month_df_1990['Min Temp'],
-            month_df_1990['Avg Temp']
-        ])
-        month_max_90 = combined_temps_1990.max()
-        month_min_90 = combined_temps_1990.min()
-        month_avg_90 = combined_temps_1990.mean()
-        fig.add_trace(go.Box(
-            y=combined_temps_1990,
-            x=[month_name]*len(combined_temps_1990),
-            name=None,
-            legendgroup=month_name,
-            showlegend=False,
-            marker_color='#888888',
-            line_color='#888888',
-            boxmean=False,
-            boxpoints=False,
-            hoveron='boxes',
-            visible=False,
-            opacity=0.7,
-            customdata=[[month_max_90, month_min_90, month_avg_90]] * len(combined_temps_1990),
-            hoverinfo='skip',
-            hovertemplate=(
-                '<b>%{x}</b><br>' +
-                'Max: %{customdata[0]:.1f}°F<br>' +
-                'Min: %{customdata[1]:.1f}°F<br>' +
-                'Avg: %{customdata[2]:.1f}°F<br>' +
-                '<extra></extra>'
-            )
-        ))
-        monthly_box_indices_1990.append(len(fig.data) - 1)
-        fig.add_trace(go.Scatter(
-            x=[month_name],
-            y=[month_avg_90],
-            mode='lines',
-            line=dict(color='white', width=4),
-            name=None,
-            legendgroup=month_name,
-            showlegend=False,
-            visible=False,
-            hovertemplate='<b>%{x}</b><br>Avg: %{y:.1f}°F<br><extra></extra>'
-        ))
-        monthly_avg_indices_1990.append(len(fig.data) - 1)
-        fig.add_trace(go.Scatter(
-            x=[month_name],
-            y=[month_df_1990['Max Temp'].mean()],
-            mode='lines',
-            line=dict(color='#AAAAAA', width=4),
-            name=None,
-            legendgroup=month_name,
-            showlegend=False,
-            visible=False,
-            hovertemplate='<b>%{x}</b><br>Max: %{y:.1f}°F<br><extra></extra>'
-        ))
-        monthly_max_indices_1990.append(len(fig.data) - 1)
-        fig.add_trace(go.Scatter(
-            x=[month_name],
-            y=[month_df_1990['Min Temp'].mean()],
-            mode='lines',
-            line=dict(color='#CCCCCC', width=4),
-            name=None,
-            legendgroup=month_name,
-            showlegend=False,
-            visible=False,
-            hovertemplate='<b>%{x}</b><br>Min: %{y:.1f}°F<br><extra></extra>'
-        ))
-        monthly_min_indices_1990.append(len(fig.data) - 1)
-
-# --- Highlight Differences Bar Chart (all data, with bar text labels) ---
-highlight_months = [2, 6, 7, 8, 9, 10, 12]
-highlight_month_names = [calendar.month_abbr[m] for m in highlight_months]
-bar_categories = ['Max', 'Avg', 'Min']
-
-# Prepare data structure: {stat: [per month values]}
-vals_2024 = {stat: [] for stat in bar_categories}
-vals_1990 = {stat: [] for stat in bar_categories}
-text_2024 = {stat: [] for stat in bar_categories}
-text_1990 = {stat: [] for stat in bar_categories}
-
-for m in highlight_months:
-    month_name = calendar.month_abbr[m]
-    month_df_2024 = df_2024[(df_2024['Date'].dt.month == m) & (df_2024['Date'].dt.year == 2024)]
-    month_df_1990 = df_1990[(df_1990['Date'].dt.month == m) & (df_1990['Date'].dt.year == 1990)]
-    for stat, col in zip(bar_categories, ['Max Temp', 'Avg Temp', 'Min Temp']):
-        # 2024
-        if not month_df_2024.empty:
-            val_2024 = month_df_2024[col].max() if stat == 'Max' else (month_df_2024[col].min() if stat == 'Min' else month_df_2024[col].mean())
-            text_2024[stat].append(f"2024 {stat}: {val_2024:.1f}°F")
-        else:
-            val_2024 = np.nan
-            text_2024[stat].append("")
-        vals_2024[stat].append(val_2024)
-        # 1990
-        if not month_df_1990.empty:
-            val_1990 = month_df_1990[col].max() if stat == 'Max' else (month_df_1990[col].min() if stat == 'Min' else month_df_1990[col].mean())
-            text_1990[stat].append(f"1990 {stat}: {val_1990:.1f}°F")
+
+# Library functions that used to be reachable through this module
+def __getattr__(name):
+    if name in ('load_and_standardize_csv', 'align_to_reference_year'):
+        import temperature_data
+        return getattr(temperature_data, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def _baseline_setting(value):
+    if not value:
+        return None
+    from temperature_figures import parse_baseline
+    return list(parse_baseline(value))
+
+
+# Every environment setting of the app, read when called
+def settings_from_env(default_mode='development'):
+    return {
+        # APP_ENV=production serves without the debugger/reloader and builds
+        # the figures up front (see serve() and wsgi.py)
+        'mode': os.environ.get('APP_ENV', default_mode).lower(),
+        # LAZY_FIGURES=1 makes the Dash app build each view as its own figure when
+        # its tab is selected, so the first page load only carries the default view
+        'lazy_figures': _env_flag('LAZY_FIGURES'),
+        # LINE_POINT_BUDGET=N downsamples each daily line trace to at most N points
+        # (DOWNSAMPLE_METHOD=lttb or minmax); zooming in re-samples the visible window
+        'line_point_budget': int(os.environ['LINE_POINT_BUDGET']) if os.environ.get('LINE_POINT_BUDGET') else None,
+        'downsample_method': os.environ.get('DOWNSAMPLE_METHOD', 'lttb'),
+        # PRECOMPUTED_BOXES=1 sends box-plot quartiles/fences computed on the server
+        # instead of every daily value
+        'precomputed_boxes': _env_flag('PRECOMPUTED_BOXES'),
+        # CONSOLIDATED_BOXES=1 draws the box view as one box trace per year and the
+        # month shading as one trace, instead of traces per month
+        'consolidated_boxes': _env_flag('CONSOLIDATED_BOXES'),
+        # CLIMATOLOGY_BASELINE=1991-2020 draws the normal range (p10-p90, p25-p75
+        # and median of each day) across those years behind the line view; the
+        # app gets a slider to pick another window
+        'climatology_baseline': _baseline_setting(os.environ.get('CLIMATOLOGY_BASELINE')),
+        # FAST_FIGURES=1 assembles figures as plain dicts (see fast_figures.py)
+        # instead of through plotly.graph_objects; the output is the same
+        'fast_figures': _env_flag('FAST_FIGURES'),
+        # Built figures are cached by dataset fingerprint + view parameters, in memory
+        # (FIGURE_CACHE_SIZE entries) and optionally as JSON files in FIGURE_CACHE_DIR
+        'figure_cache_size': int(os.environ.get('FIGURE_CACHE_SIZE', 32)),
+        'figure_cache_dir': os.environ.get('FIGURE_CACHE_DIR'),
+        # WATCH_DATA=1 re-checks the data directory every WATCH_INTERVAL seconds
+        # (default 30) and pushes new or changed months to open pages as a patch of
+        # the affected traces (see incremental_updates.py)
+        'watch_data': _env_flag('WATCH_DATA'),
+        'watch_interval': float(os.environ.get('WATCH_INTERVAL', 30)),
+        # Responses are gzip/brotli compressed unless COMPRESS_RESPONSES=0;
+        # HEADER_VARIANTS=1 serves AVIF/WebP copies of the header image
+        # (needs Pillow), see http_caching.py
+        'compress_responses': os.environ.get('COMPRESS_RESPONSES', '1').lower() not in ('0', 'false', 'no'),
+        'header_variants': _env_flag('HEADER_VARIANTS'),
+    }
+
+
+class ComparisonFigures:
+    # The loaded dataset plus everything needed to build (and cache) the
+    # figures comparing current_year with historical_year for one station
+
+    def __init__(self, dataset, settings, current_year=CURRENT_YEAR, historical_year=HISTORICAL_YEAR,
+                 station=None):
+        from figure_cache import FigureCache
+        self.dataset = dataset
+        self.settings = settings
+        self.current_year = current_year
+        self.historical_year = historical_year
+        self.station = station or dataset.default_station
+        self.cache = FigureCache(max_entries=settings['figure_cache_size'],
+                                 disk_dir=settings['figure_cache_dir'],
+                                 figure_dicts=settings['fast_figures'])
+
+    # view is one of VIEWS, or 'all' for the combined figure with updatemenus buttons;
+    # x_range is a zoomed [start, end] window of the line view, baseline the
+    # [start, end] years of its climatology bands (default: the configured one)
+    # and difference_years the [first, second] years of the calendar heatmap's
+    # difference strip (default: the compared years)
+    def view_figure(self, view, x_range=None, baseline=None, difference_years=None):
+        from figure_cache import figure_cache_key
+        from temperature_figures import webgl_point_threshold
+        settings = self.settings
+        baseline = baseline or settings['climatology_baseline']
+        if view not in ('all', 'Line Plot'):
+            baseline = None
+        difference_years = list(difference_years) if difference_years else None
+        if view not in ('all', 'Calendar Heatmap') or difference_years == [self.current_year, self.historical_year]:
+            difference_years = None
+        if settings['fast_figures']:
+            from fast_figures import combined_figure_dict as build_combined_figure
+            from fast_figures import view_figure_dict as build_view_figure
         else:
-            val_1990 = np.nan
-            text_1990[stat].append("")
-        vals_1990[stat].append(val_1990)
-
-# Remove old highlight bar indices
-highlight_bar_indices = []
-
-# Add bars: for each stat/year
-bar_colors_2024 = {'Max': '#4A90E2', 'Avg': '#AB47BC', 'Min': '#66BB6A'}
-bar_colors_1990 = {'Max': '#73A3B3', 'Avg': '#C3A6C7', 'Min': '#A8BFA8'}
-for stat in bar_categories:
-    # 2024
-    idx_2024 = len(fig.data)
-    fig.add_trace(go.Bar(
-        x=highlight_month_names,
-        y=vals_2024[stat],
-        name=f'2024 {stat}',
-        marker_color=bar_colors_2024[stat],
-        opacity=0.9,
-        showlegend=True,
-        visible=False,
-        legendgroup=f'highlight_{stat}',
-        hovertemplate='2024 '+stat+'<br>%{x}: %{y:.1f}°F<extra></extra>',
-        text=text_2024[stat],
-        textposition='auto',
-    ))
-    highlight_bar_indices.append(idx_2024)
-    # 1990
-    idx_1990 = len(fig.data)
-    fig.add_trace(go.Bar(
-        x=highlight_month_names,
-        y=vals_1990[stat],
-        name=f'1990 {stat}',
-        marker_color=bar_colors_1990[stat],
-        opacity=0.7,
-        showlegend=True,
-        visible=False,
-        legendgroup=f'highlight_{stat}',
-        hovertemplate='1990 '+stat+'<br>%{x}: %{y:.1f}°F<extra></extra>',
-        text=text_1990[stat],
-        textposition='auto',
-    ))
-    highlight_bar_indices.append(idx_1990)
-
-# Only bar indices should be visible for highlight differences
-all_highlight_indices = highlight_bar_indices
-
-# Remove highlight_annotations from layout (none needed for simple bars)
-fig.layout.annotations = [a for a in fig.layout.annotations if not (isinstance(a, dict) and a.get('text', '').startswith('Δ'))]
-
-# --- Add invisible dummy traces for each month to pin all months on the x-axis (with out-of-range y-values)
-for month in ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']:
-    fig.add_trace(go.Scatter(
-        x=[month],
-        y=[-9999],
-        mode='markers',
-        marker=dict(opacity=0),
-        showlegend=False,
-        hoverinfo='skip',
-        visible=True
-    ))
-
-# Map month names to x-axis indices for categorical axis
-month_names = [calendar.month_abbr[m] for m in box_months]
-month_name_to_idx = {name: idx for idx, name in enumerate(month_names)}
-
-# Alternate month shading for clarity
-min_temp = min(
-    df_2024['Min Temp'].min(),
-    df_1990['Min Temp'].min()
-)
-max_temp = max(
-    df_2024['Max Temp'].max(),
-    df_1990['Max Temp'].max()
-)
-for month in range(1, 13):
-    if month % 2 == 0:  # Shade only even months
-        fig.add_shape(
-            type="rect",
-            x0=pd.Timestamp(f"2024-{month:02d}-01"),
-            x1=pd.Timestamp(f"2024-{month % 12 + 1:02d}-01"),  # Next month
-            y0=min_temp - 2,
-            y1=max_temp + 2,
-            fillcolor="rgba(200,200,200,0.15)",
-            layer="below",
-            line_width=0,
+            from temperature_figures import build_combined_figure, build_view_figure
+        key = figure_cache_key(
+            self.dataset.fingerprint(), view=view, station=self.station,
+            years=[self.current_year, self.historical_year],
+            max_points=settings['line_point_budget'], downsample_method=settings['downsample_method'],
+            x_range=x_range, precomputed_boxes=settings['precomputed_boxes'],
+            consolidated_boxes=settings['consolidated_boxes'], baseline=baseline,
+            difference_years=difference_years,
+            # Not part of the figure itself, but of what is cached: dicts or
+            # graph_objects, and the Scatter/Scattergl cut-off
+            fast_figures=settings['fast_figures'], webgl_threshold=webgl_point_threshold(),
+        )
+        args = (self.dataset, self.station, self.current_year, self.historical_year)
+        if view == 'all':
+            return self.cache.get_or_build(
+                key, lambda: build_combined_figure(
+                    *args,
+                    max_points=settings['line_point_budget'], downsample_method=settings['downsample_method'],
+                    precomputed_boxes=settings['precomputed_boxes'],
+                    consolidated_boxes=settings['consolidated_boxes'], baseline=baseline,
+                    difference_years=difference_years))
+        return self.cache.get_or_build(
+            key, lambda: build_view_figure(
+                view, *args,
+                max_points=settings['line_point_budget'], downsample_method=settings['downsample_method'],
+                x_range=x_range, precomputed_boxes=settings['precomputed_boxes'],
+                consolidated_boxes=settings['consolidated_boxes'], baseline=baseline,
+                difference_years=difference_years))
+
+    # dash.Patch swapping the calendar heatmap's difference strip of the page's
+    # figure (view_figure(view, baseline=baseline)) for the one of
+    # difference_years, leaving every other trace as it is
+    def difference_patch(self, view, difference_years, baseline=None):
+        from dash import Patch
+        from temperature_figures import difference_heatmap_trace_spec, difference_trace_index
+        index = difference_trace_index(self.view_figure(view, baseline=baseline))
+        spec = difference_heatmap_trace_spec(self.dataset, self.station, self.current_year, difference_years)
+        patched = Patch()
+        for key in ('y', 'z', 'name', 'hovertemplate'):
+            patched['data'][index][key] = spec[key]
+        return patched
+
+    # dash.Patch re-sampling the daily line traces of the combined figure
+    # (view_figure('all', baseline=baseline)) for x_range, the eager mode
+    # counterpart of view_figure('Line Plot', x_range). Which view is showing
+    # is client state and the heatmap view zooms the same date axis, so the
+    # traces keep the full year's points outside the window: switching back
+    # to the line view never shows a cut-off line.
+    def line_patch(self, x_range, baseline=None):
+        import numpy as np
+        import pandas as pd
+        from dash import Patch
+        from temperature_figures import line_trace_indices, line_trace_specs
+        settings = self.settings
+        indices = line_trace_indices(self.view_figure('all', baseline=baseline),
+                                     self.current_year, self.historical_year)
+        args = (self.dataset, self.station, self.current_year, self.historical_year)
+        options = dict(max_points=settings['line_point_budget'], downsample_method=settings['downsample_method'])
+        specs = [spec for spec, _ in line_trace_specs(*args, **options)]
+        if x_range is not None:
+            start, end = (np.datetime64(pd.Timestamp(value)) for value in x_range)
+            zoomed = [spec for spec, _ in line_trace_specs(*args, x_range=x_range, **options)]
+            for spec, window in zip(specs, zoomed):
+                before, after = spec['x'] < start, spec['x'] > end
+                for key in ('x', 'y', 'customdata'):
+                    if key in spec:
+                        spec[key] = np.concatenate([spec[key][before], window[key], spec[key][after]])
+        patched = Patch()
+        for index, spec in zip(indices, specs):
+            for key in ('x', 'y', 'customdata'):
+                if key in spec:
+                    patched['data'][index][key] = spec[key]
+        return patched
+
+    # Build every figure the app can serve without user input (the combined
+    # figure, or each tab's view in lazy mode), so that WSGI workers forked
+    # from a preloaded app start with them cached
+    def warm(self):
+        from temperature_figures import VIEWS
+        for view in (VIEWS if self.settings['lazy_figures'] else ['all']):
+            self.view_figure(view)
+
+    # FigureUpdater keeping the open pages in step with the data directory
+    # (only used with WATCH_DATA=1)
+    def updater(self):
+        from incremental_updates import FigureUpdater
+        settings = self.settings
+        return FigureUpdater(
+            self.dataset, self.station, self.current_year, self.historical_year,
+            max_points=settings['line_point_budget'], downsample_method=settings['downsample_method'],
+            precomputed_boxes=settings['precomputed_boxes'], consolidated_boxes=settings['consolidated_boxes'],
+            baseline=settings['climatology_baseline'], patch_figure=not settings['lazy_figures'], min_interval=settings['watch_interval'] / 2,
         )
 
-# Update axes
-fig.update_xaxes(
-    gridwidth=1,
-    gridcolor='rgba(0, 0, 0, 0.1)',
-    tickformat='%b',  # Only show month abbreviation
-    tickfont=dict(size=8),  # Even smaller font
-    tickangle=45,  # Slightly less steep for readability
-    tickmode='array',
-    tickvals=[pd.Timestamp(f'2024-{month:02d}-01') for month in range(1, 13)],
-)
-fig.update_yaxes(
-    gridwidth=1,
-    gridcolor='rgba(0, 0, 0, 0.1)'
-)
+
+# Load every monthly CSV under data_dir and wrap it for figure building
+def create_figures(data_dir='.', settings=None):
+    from temperature_dataset import TemperatureDataset
+    if settings is None:
+        settings = settings_from_env()
+    dataset = TemperatureDataset(data_dir).load()
+    return ComparisonFigures(dataset, settings)
+
+
+# Zoomed x-range from a dcc.Graph relayoutData event: a [start, end] pair,
+# None when the axis was reset, or False when the event is not an x zoom
+def zoomed_x_range(relayout_data):
+    if not relayout_data:
+        return False
+    if relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return [relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']]
+    if 'xaxis.range' in relayout_data:
+        return list(relayout_data['xaxis.range'])
+    return False
+
 
 # Load header image as base64 so it embeds directly in the HTML
-header_image_path = Path("climate vis phoenix header.png")
-if header_image_path.exists():
+# (None when the image is missing)
+def header_image_source(path="climate vis phoenix header.png"):
+    header_image_path = Path(path)
+    if not header_image_path.exists():
+        return None  # Fallback – will try path reference
     with open(header_image_path, "rb") as img_file:
         header_image_base64 = base64.b64encode(img_file.read()).decode()
-    header_source = f"data:image/png;base64,{header_image_base64}"
-else:
-    header_source = None  # Fallback – will try path reference
+    return f"data:image/png;base64,{header_image_base64}"
+
 
 # Define header annotation once so it can be reused in layout updates
 header_annotation = dict(
@@ -435,252 +261,423 @@ header_annotation = dict(
     yanchor="top"
 )
 
-# Restore trace count variables for updatemenus logic
-n_line = sum(len(v) for v in trace_indices['line'].values())
-n_box = len(monthly_box_indices_2024) + len(monthly_box_indices_1990)
-n_max = len(monthly_max_indices_2024) + len(monthly_max_indices_1990)
-n_min = len(monthly_min_indices_2024) + len(monthly_min_indices_1990)
-n_avg = len(monthly_avg_indices_2024) + len(monthly_avg_indices_1990)
-n_highlight = len(all_highlight_indices)
-
-all_line_indices = [i for v in trace_indices['line'].values() for i in v]
-all_box_indices = monthly_box_indices_2024 + monthly_box_indices_1990
-all_max_indices = monthly_max_indices_2024 + monthly_max_indices_1990
-all_min_indices = monthly_min_indices_2024 + monthly_min_indices_1990
-all_avg_indices = monthly_avg_indices_2024 + monthly_avg_indices_1990
-
-# --- Enhanced legend appearance (keep this only, but do NOT increase line width for legend) ---
-fig.update_layout(
-    legend=dict(
-        yanchor="top",
-        y=0.99,
-        xanchor="left",
-        x=1.05,
-        bgcolor='rgba(255, 255, 255, 0.95)',
-        bordercolor='rgba(0, 0, 0, 0.3)',
-        borderwidth=1,
-        font=dict(size=15),
-        tracegroupgap=30,
-        itemsizing='constant',
-        title_font=dict(size=16),
-        itemwidth=40,
-        itemclick='toggleothers',
-        itemdoubleclick='toggle'
-    ),
-    legend_traceorder='grouped',
-)
-
-# --- Layout polish: white background, header, and horizontal tab buttons ---
-# Set background to white
-fig.update_layout(
-    plot_bgcolor='white',
-    paper_bgcolor='white',
-    margin=dict(t=40)
-)
-
-# --- Update updatemenus to horizontal tab-style buttons ---
-fig.update_layout(
-    updatemenus=[
-        dict(
-            buttons=[
-                dict(
-                    label='Line Plot',
-                    method='update',
-                    args=[
-                        {'visible': [i in all_line_indices for i in range(n_line + n_box + n_max + n_min + n_avg + n_highlight + 12)]},
-                        {'xaxis': {'type': 'date', 'title': 'Date / Month', 'tickangle': 45, 'automargin': True},
-                         'annotations': []}
-                    ],
-                ),
-                dict(
-                    label='Monthly Box Plot',
-                    method='update',
-                    args=[
-                        {'visible': [i in (all_box_indices + all_max_indices + all_min_indices + all_avg_indices) for i in range(n_line + n_box + n_max + n_min + n_avg + n_highlight + 12)]},
-                        {'xaxis': {'type': 'category', 'title': 'Month', 'categoryorder': 'array', 'automargin': True},
-                         'annotations': []},
-                    ],
-                ),
-                dict(
-                    label='Highlight Differences',
-                    method='update',
-                    args=[
-                        {'visible': [i in all_highlight_indices for i in range(n_line + n_box + n_max + n_min + n_avg + n_highlight + 12)]},
-                        {'xaxis': {'type': 'category', 'title': 'Month', 'automargin': True},
-                         'annotations': []},
-                    ],
-                ),
-            ],
-            direction='right',  # Horizontal row
-            showactive=True,
-            x=0.5,
-            xanchor='center',
-            y=1.06,
-            yanchor='top',
-            bordercolor="#888",
-            bgcolor="#f6f6f6",
-            borderwidth=1,
-            font=dict(size=16, family="Arial"),
-            pad=dict(r=10, t=10, b=10, l=10),
-            type='buttons',
-        ),
-    ]
-)
-
-# Set default: show line plot traces only
-for i, trace in enumerate(fig.data):
-    trace.visible = (i in all_line_indices)
 
 # --- Dash App Layout ---
-import dash
-from dash import html, dcc
-
 # Make sure the header image is in the 'assets' folder as 'climate-phoenix-header.png'
 # If not, move it there for Dash to serve it automatically.
+# years (the station's loaded years) bound the climatology baseline slider
+# and fill the difference year selectors, which start at difference_years;
+# figure_version is the FigureUpdater version of figure (WATCH_DATA=1).
+def build_layout(figure, settings, years=None, figure_version=None, difference_years=(CURRENT_YEAR, HISTORICAL_YEAR)):
+    from dash import html, dcc
+    from http_caching import ASSETS_DIR, asset_url, prepare_image_variants
+    from temperature_figures import DEFAULT_VIEW, VIEWS
+
+    header_image = html.Img(
+        src=asset_url('climate-phoenix-header.png'),
+        style={
+            'width': '100%',
+            'height': '320px',
+            'objectFit': 'cover',
+            'filter': 'brightness(0.65)',
+            'display': 'block',
+            'boxShadow': '0 4px 16px 0 rgba(0,0,0,0.13)'
+        },
+        alt='Phoenix Climate Header Image'
+    )
+    variants = prepare_image_variants(ASSETS_DIR / 'climate-phoenix-header.png') if settings['header_variants'] else []
+    if variants:
+        # Browsers pick the first format they support, else the PNG
+        header_image = html.Picture(
+            [html.Source(srcSet=asset_url(name), type=mime) for name, mime in variants] + [header_image],
+            style={'display': 'block'}
+        )
 
-app = dash.Dash(__name__)
-
-app.layout = html.Div([
-    # Header image with overlay text (fixed height)
-    html.Div([
-        html.Img(
-            src='/assets/climate-phoenix-header.png',
-            style={
-                'width': '100%',
-                'height': '320px',
-                'objectFit': 'cover',
-                'filter': 'brightness(0.65)',
-                'display': 'block',
-                'boxShadow': '0 4px 16px 0 rgba(0,0,0,0.13)'
-            },
-            alt='Phoenix Climate Header Image'
-        ),
-        html.Div(
-            "Phoenix Temperature Comparison 1990 vs 2024 by Maeve Byrne",
-            style={
-                'position': 'absolute',
-                'top': '50%',
-                'left': '50%',
-                'transform': 'translate(-50%, -50%)',
-                'width': '100%',
-                'textAlign': 'center',
-                'color': 'white',
-                'fontSize': '2.6em',
-                'fontWeight': 'bold',
-                'textShadow': '2px 2px 8px #000',
-                'pointerEvents': 'none',
-                'padding': '0 12px',
-                'zIndex': 2
-            }
+    baseline = settings['climatology_baseline']
+    baseline_controls = []
+    if baseline:
+        years = sorted(set(years or []) | set(baseline))
+        baseline_controls = [html.Div([
+            html.Label("Normal range baseline", htmlFor='baseline-years', style={'fontWeight': 'bold'}),
+            dcc.RangeSlider(
+                id='baseline-years',
+                min=years[0],
+                max=years[-1],
+                step=1,
+                value=baseline,
+                marks={year: str(year) for year in years if year % 10 == 0 or year in (years[0], years[-1])},
+                allowCross=False,
+                tooltip={'placement': 'bottom'},
+            ),
+        ], style={'padding': '12px 24px 0'})]
+
+    # Calendar heatmap difference strip: first year minus second year
+    difference_controls = []
+    if years:
+        year_options = [{'label': str(year), 'value': year} for year in sorted(years)]
+        dropdown_style = {'width': '110px'}
+        difference_controls = [html.Div([
+            html.Label("Heatmap difference", htmlFor='difference-first', style={'fontWeight': 'bold'}),
+            dcc.Dropdown(id='difference-first', options=year_options, value=difference_years[0],
+                         clearable=False, style=dropdown_style),
+            html.Span("minus"),
+            dcc.Dropdown(id='difference-second', options=year_options, value=difference_years[1],
+                         clearable=False, style=dropdown_style),
+        ], style={'display': 'flex', 'alignItems': 'center', 'gap': '10px', 'padding': '12px 24px 0'})]
+
+    return html.Div([
+        # Header image with overlay text (fixed height)
+        html.Div([
+            header_image,
+            html.Div(
+                "Phoenix Temperature Comparison 1990 vs 2024 by Maeve Byrne",
+                style={
+                    'position': 'absolute',
+                    'top': '50%',
+                    'left': '50%',
+                    'transform': 'translate(-50%, -50%)',
+                    'width': '100%',
+                    'textAlign': 'center',
+                    'color': 'white',
+                    'fontSize': '2.6em',
+                    'fontWeight': 'bold',
+                    'textShadow': '2px 2px 8px #000',
+                    'pointerEvents': 'none',
+                    'padding': '0 12px',
+                    'zIndex': 2
+                }
+            )
+        ], style={
+            'position': 'relative',
+            'height': '320px',
+            'overflow': 'hidden',
+            'marginBottom': '0px',
+            'boxShadow': '0 4px 16px 0 rgba(0,0,0,0.13)'
+        }),
+
+        # Intro/Explanation section above the data
+        html.Div([
+            html.H2("About This Visualization", style={'color': '#1E3D59', 'fontWeight': 'bold', 'marginBottom': '18px'}),
+            html.P("This data shows the monthly maximum, minimum, and average temperature of the Phoenix Metropolitan area for the years 2024 and 1990. Can you see how the temperature has changed over the last 25 years?", style={'fontSize': '1.18em', 'margin': 'auto', 'maxWidth': '700px'}),
+            html.H4("What do the tabs show?", style={'color': '#2E7D32', 'marginTop': '28px'}),
+            html.Ul([
+                html.Li([
+                    html.B("Line Plot: "),
+                    "Overarching view of the maximum, minimum, and average temperatures for both years."
+                ]),
+                html.Li([
+                    html.B("Monthly Box Plot: "),
+                    "Comparison of averaged daily temperatures for each month."
+                ]),
+                html.Li([
+                    html.B("Highlight Differences: "),
+                    "Key differences in temperature statistics between the two years."
+                ]),
+                html.Li([
+                    html.B("Calendar Heatmap: "),
+                    "Every day of every loaded year, with the day-by-day difference between the two years above it."
+                ]),
+            ], style={'textAlign': 'left', 'maxWidth': '700px', 'margin': '24px auto', 'fontSize': '1.08em'})
+        ], style={
+            'background': '#e7f0fa',  # Soft blue
+            'padding': '36px 0 24px 0',
+            'textAlign': 'center',
+            'borderRadius': '0 0 18px 18px',
+            'marginBottom': '28px',
+            'boxShadow': '0 2px 8px 0 rgba(30,61,89,0.06)'
+        }),
+
+        # Data section fills the viewport after scroll
+        html.Div([
+            html.Div(([
+                dcc.Tabs(
+                    id='view-tabs',
+                    value=DEFAULT_VIEW,
+                    children=[dcc.Tab(label=view, value=view) for view in VIEWS]
+                )
+            ] if settings['lazy_figures'] else []) + baseline_controls + difference_controls + ([
+                dcc.Interval(id='data-poll', interval=int(settings['watch_interval'] * 1000)),
+                dcc.Store(id='figure-version', data=figure_version),
+            ] if settings['watch_data'] else []) + [
+                dcc.Graph(
+                    figure=figure,
+                    id='temperature-plot',
+                    style={
+                        'height': '80vh',  # Responsive height
+                        'width': '100%',
+                    },
+                    config={
+                        'responsive': True
+                    }
+                )
+            ], style={'width': '100%'})
+        ], style={
+            'width': '90vw',
+            'maxWidth': '1200px',
+            'minHeight': '80vh',
+            'margin': '0 auto',
+            'display': 'flex',
+            'alignItems': 'center',
+            'justifyContent': 'center',
+            'paddingTop': '48px',
+            'paddingBottom': '48px'
+        }),
+
+        # Resources section below the data
+        html.Div([
+            html.H2("Further Resources", style={'color': '#2E7D32', 'fontWeight': 'bold', 'marginBottom': '18px'}),
+            html.Div([
+                html.Iframe(
+                    src="https://www.youtube.com/embed/ZQ6fSHr5TJg",
+                    style={'width': '100%', 'height': '360px', 'border': 'none', 'borderRadius': '12px', 'maxWidth': '700px', 'margin': 'auto', 'display': 'block'}
+                )
+            ], style={'maxWidth': '700px', 'margin': 'auto'}),
+            html.H4("Explore More:"),
+            html.Ul([
+                html.Li(html.A("National Weather Service: Phoenix", href="https://www.weather.gov/psr/", target="_blank")),
+                html.Li(html.A("Climate Data Online", href="https://www.ncdc.noaa.gov/cdo-web/", target="_blank")),
+                html.Li(html.A("City of Phoenix Sustainability Department", href="https://www.phoenix.gov/administration/departments/sustainability.html", target="_blank"))
+            ], style={'listStyleType': 'none', 'padding': 0, 'fontSize': '1.08em', 'margin': '24px auto', 'maxWidth': '700px'}),
+        ], style={
+            'background': '#e8f5e9',  # Soft green
+            'padding': '36px 0 36px 0',
+            'textAlign': 'center',
+            'borderRadius': '18px 18px 0 0',
+            'marginTop': '32px',
+            'boxShadow': '0 -2px 8px 0 rgba(46,125,50,0.09)'
+        })
+    ])
+
+def register_callbacks(app, figures, updater=None):
+    import dash
+    from incremental_updates import ops_to_patch
+    settings = figures.settings
+    # The baseline slider's window (only there with CLIMATOLOGY_BASELINE set);
+    # callbacks take it as an extra last argument
+    baseline_state = [dash.State('baseline-years', 'value')] if settings['climatology_baseline'] else []
+    # The calendar heatmap's difference year selectors
+    difference_inputs = [dash.Input('difference-first', 'value'), dash.Input('difference-second', 'value')]
+    difference_state = [dash.State('difference-first', 'value'), dash.State('difference-second', 'value')]
+    default_pair = [figures.current_year, figures.historical_year]
+
+    if settings['lazy_figures']:
+        @app.callback(
+            dash.Output('temperature-plot', 'figure'),
+            dash.Input('view-tabs', 'value'),
+            dash.Input('temperature-plot', 'relayoutData'),
+            *difference_inputs,
+            *([dash.Input('baseline-years', 'value')] if baseline_state else []),
+            prevent_initial_call=True
         )
-    ], style={
-        'position': 'relative',
-        'height': '320px',
-        'overflow': 'hidden',
-        'marginBottom': '0px',
-        'boxShadow': '0 4px 16px 0 rgba(0,0,0,0.13)'
-    }),
-
-    # Intro/Explanation section above the data
-    html.Div([
-        html.H2("About This Visualization", style={'color': '#1E3D59', 'fontWeight': 'bold', 'marginBottom': '18px'}),
-        html.P("This data shows the monthly maximum, minimum, and average temperature of the Phoenix Metropolitan area for the years 2024 and 1990. Can you see how the temperature has changed over the last 25 years?", style={'fontSize': '1.18em', 'margin': 'auto', 'maxWidth': '700px'}),
-        html.H4("What do the tabs show?", style={'color': '#2E7D32', 'marginTop': '28px'}),
-        html.Ul([
-            html.Li([
-                html.B("Line Plot: "),
-                "Overarching view of the maximum, minimum, and average temperatures for both years."
-            ]),
-            html.Li([
-                html.B("Monthly Box Plot: "),
-                "Comparison of averaged daily temperatures for each month."
-            ]),
-            html.Li([
-                html.B("Highlight Differences: "),
-                "Key differences in temperature statistics between the two years."
-            ]),
-        ], style={'textAlign': 'left', 'maxWidth': '700px', 'margin': '24px auto', 'fontSize': '1.08em'})
-    ], style={
-        'background': '#e7f0fa',  # Soft blue
-        'padding': '36px 0 24px 0',
-        'textAlign': 'center',
-        'borderRadius': '0 0 18px 18px',
-        'marginBottom': '28px',
-        'boxShadow': '0 2px 8px 0 rgba(30,61,89,0.06)'
-    }),
-
-    # Data section fills the viewport after scroll
-    html.Div([
-        dcc.Graph(
-            figure=fig,
-            id='temperature-plot',
-            style={
-                'height': '80vh',  # Responsive height
-                'width': '100%',
-            },
-            config={
-                'responsive': True
-            }
+        def show_view(view, relayout_data, first, second, baseline=None):
+            if dash.ctx.triggered_id == 'temperature-plot':
+                # Re-sample the line view for the zoomed window when downsampling
+                x_range = zoomed_x_range(relayout_data)
+                if view != 'Line Plot' or settings['line_point_budget'] is None or x_range is False:
+                    return dash.no_update
+                with recorder.run(f'zoom {view}'):
+                    return figures.view_figure(view, x_range, baseline)
+            if dash.ctx.triggered_id in ('difference-first', 'difference-second'):
+                # Only the difference strip changes
+                if view != 'Calendar Heatmap':
+                    return dash.no_update
+                with recorder.run('difference'):
+                    return figures.difference_patch(view, [first, second])
+            if dash.ctx.triggered_id == 'baseline-years' and view != 'Line Plot':
+                return dash.no_update
+            with recorder.run(f'view {view}'):
+                return figures.view_figure(view, baseline=baseline, difference_years=[first, second])
+    else:
+        # Patch only the difference strip of the combined figure
+        @app.callback(
+            dash.Output('temperature-plot', 'figure', allow_duplicate=True),
+            *difference_inputs,
+            *baseline_state,
+            prevent_initial_call=True
         )
-    ], style={
-        'width': '90vw',
-        'maxWidth': '1200px',
-        'minHeight': '80vh',
-        'margin': '0 auto',
-        'display': 'flex',
-        'alignItems': 'center',
-        'justifyContent': 'center',
-        'paddingTop': '48px',
-        'paddingBottom': '48px'
-    }),
-
-    # Resources section below the data
-    html.Div([
-        html.H2("Further Resources", style={'color': '#2E7D32', 'fontWeight': 'bold', 'marginBottom': '18px'}),
-        html.Div([
-            html.Iframe(
-                src="https://www.youtube.com/embed/ZQ6fSHr5TJg",
-                style={'width': '100%', 'height': '360px', 'border': 'none', 'borderRadius': '12px', 'maxWidth': '700px', 'margin': 'auto', 'display': 'block'}
+        def show_difference(first, second, baseline=None):
+            with recorder.run('difference'):
+                return figures.difference_patch('all', [first, second], baseline)
+
+        if settings['line_point_budget'] is not None:
+            # Re-sample the line traces for the zoomed window, as the lazy
+            # line view does. Only date ranges count: the box and bar views
+            # zoom a category axis.
+            @app.callback(
+                dash.Output('temperature-plot', 'figure', allow_duplicate=True),
+                dash.Input('temperature-plot', 'relayoutData'),
+                *baseline_state,
+                prevent_initial_call=True
             )
-        ], style={'maxWidth': '700px', 'margin': 'auto'}),
-        html.H4("Explore More:"),
-        html.Ul([
-            html.Li(html.A("National Weather Service: Phoenix", href="https://www.weather.gov/psr/", target="_blank")),
-            html.Li(html.A("Climate Data Online", href="https://www.ncdc.noaa.gov/cdo-web/", target="_blank")),
-            html.Li(html.A("City of Phoenix Sustainability Department", href="https://www.phoenix.gov/administration/departments/sustainability.html", target="_blank"))
-        ], style={'listStyleType': 'none', 'padding': 0, 'fontSize': '1.08em', 'margin': '24px auto', 'maxWidth': '700px'}),
-    ], style={
-        'background': '#e8f5e9',  # Soft green
-        'padding': '36px 0 36px 0',
-        'textAlign': 'center',
-        'borderRadius': '18px 18px 0 0',
-        'marginTop': '32px',
-        'boxShadow': '0 -2px 8px 0 rgba(46,125,50,0.09)'
-    })
-])
+            def resample_lines(relayout_data, baseline=None):
+                x_range = zoomed_x_range(relayout_data)
+                if x_range is False or (x_range is not None and not all(isinstance(value, str) for value in x_range)):
+                    return dash.no_update
+                with recorder.run('zoom all'):
+                    return figures.line_patch(x_range, baseline)
+
+    if baseline_state and not settings['lazy_figures']:
+        # Send the combined figure with the chosen window's bands (cached per
+        # window like any other figure)
+        @app.callback(
+            dash.Output('temperature-plot', 'figure', allow_duplicate=True),
+            dash.Input('baseline-years', 'value'),
+            *difference_state,
+            prevent_initial_call=True
+        )
+        def show_baseline(baseline, first, second):
+            with recorder.run('baseline'):
+                return figures.view_figure('all', baseline=baseline, difference_years=[first, second])
+
+    if updater is not None and settings['lazy_figures']:
+        # Views are rebuilt on demand anyway: re-send the open view when its data changed
+        @app.callback(
+            dash.Output('temperature-plot', 'figure', allow_duplicate=True),
+            dash.Output('figure-version', 'data'),
+            dash.Input('data-poll', 'n_intervals'),
+            dash.State('figure-version', 'data'),
+            dash.State('view-tabs', 'value'),
+            *difference_state,
+            *baseline_state,
+            prevent_initial_call=True
+        )
+        def refresh_view(_, client_version, view, first, second, baseline=None):
+            updater.poll()
+            if client_version == updater.version:
+                return dash.no_update, dash.no_update
+            return figures.view_figure(view, baseline=baseline, difference_years=[first, second]), updater.version
+    elif updater is not None:
+        @app.callback(
+            dash.Output('temperature-plot', 'figure', allow_duplicate=True),
+            dash.Output('figure-version', 'data'),
+            dash.Input('data-poll', 'n_intervals'),
+            dash.State('figure-version', 'data'),
+            *difference_state,
+            *baseline_state,
+            prevent_initial_call=True
+        )
+        def push_updates(_, client_version, first, second, baseline=None):
+            updater.poll()
+            ops, version = updater.updates_since(client_version)
+            if ops is not None and version == client_version:
+                return dash.no_update, dash.no_update
+            if (baseline and baseline != settings['climatology_baseline']) or [first, second] != default_pair:
+                # The updater's figure has the configured window's bands and
+                # the compared years' difference strip
+                return figures.view_figure('all', baseline=baseline, difference_years=[first, second]), version
+            if ops is None:
+                # Version not in this worker's history (too old, or from a
+                # worker that saw other changes): send the whole figure
+                return updater.snapshot()
+            return ops_to_patch(ops), version
+
+    # Last instrumented runs (startup, lazy view builds, export) and the
+    # figure cache's hit/miss counts as JSON
+    @app.server.route('/_stages')
+    def stage_timings():
+        from flask import jsonify
+        return jsonify(last=recorder.last_run(), runs=recorder.history(), figure_cache=figures.cache.stats())
+
+
+# Build the Dash app: loads the data (unless figures is given), builds the
+# default figure and wires the callbacks; the ComparisonFigures used is kept
+# as app.figures. Per-stage wall/CPU time of this
+# startup (see instrumentation.py) is recorded and served at /_stages.
+def create_app(figures=None, data_dir='.', settings=None):
+    import dash
+    from http_caching import install_http_caching, layout_etag
+    with recorder.run('startup'):
+        if figures is None:
+            figures = create_figures(data_dir, settings)
+        settings = figures.settings
+        if settings['mode'] == 'production':
+            figures.warm()
+        # The all-views figure is only needed up front in eager mode
+        if settings['lazy_figures']:
+            from temperature_figures import DEFAULT_VIEW
+            figure = figures.view_figure(DEFAULT_VIEW)
+        else:
+            figure = figures.view_figure('all')
+        updater = figures.updater() if settings['watch_data'] else None
+
+        app = dash.Dash(__name__)
+        app.layout = build_layout(figure, settings, years=figures.dataset.years(figures.station),
+                                  figure_version=updater.version if updater is not None else None,
+                                  difference_years=(figures.current_year, figures.historical_year))
+        register_callbacks(app, figures, updater)
+        # ETag of the layout: startup data + figure settings
+        install_http_caching(app, layout_etag(figures.dataset.fingerprint(), settings),
+                             compress=settings['compress_responses'])
+    app.figures = figures
+    return app
+
+
+# --- Export complete interactive visualization ---
+# COMPACT_EXPORT=1 writes a typed-array payload instead of plain JSON lists
+# (see compact_export.py), COMPACT_EXPORT_GZIP=1 also gzips it
+def export_html(figures, path=EXPORT_PATH, open_browser=True):
+    export_path = Path(path)
+    with recorder.run('export'):
+        fig = figures.view_figure('all')
+        if os.environ.get("COMPACT_EXPORT", "0") == "1":
+            from compact_export import write_compact_html
+            with stage('export'):
+                write_compact_html(
+                    fig,
+                    export_path,
+                    config=HTML_CONFIG,
+                    gzip_payload=os.environ.get("COMPACT_EXPORT_GZIP", "0") == "1"
+                )
+        else:
+            import plotly.io as pio
+            with stage('serialize'):
+                html_page = pio.to_html(
+                    fig, 
+                    config=HTML_CONFIG,
+                    validate=not isinstance(fig, dict),  # FAST_FIGURES dicts are checked when built
+                    include_plotlyjs='cdn',  # Smaller file size
+                    full_html=True,
+                    include_mathjax='cdn'
+                )
+            with stage('export'):
+                export_path.write_text(html_page, encoding='utf-8')
+    if open_browser:
+        import webbrowser
+        webbrowser.open(export_path.resolve().as_uri())
+    print(f"Complete visualization saved to {export_path}")
+    return export_path
+
+
+# Serve app on PORT (default 8051). In development this is Dash's debug
+# server with the reloader; in production app.server is served by waitress
+# when it is installed (multi-threaded), otherwise by the Flask server
+# without debugger or reloader. For several worker processes run
+# `gunicorn --config gunicorn.conf.py wsgi:server` instead.
+def serve(app, host="0.0.0.0", port=None):
+    port = port or int(os.environ.get("PORT", 8051))
+    if app.figures.settings['mode'] != 'production':
+        app.run(debug=True, host=host, port=port)
+        return
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        print("waitress is not installed; serving with the threaded Flask server")
+        app.run(debug=False, host=host, port=port, threaded=True)
+        return
+    waitress_serve(app.server, host=host, port=port, threads=int(os.environ.get('WEB_THREADS', 8)))
+
+
+def main():
+    # Stage timings are logged as one JSON line per run
+    logging.basicConfig(format='%(message)s')
+    logging.getLogger('temperature.stages').setLevel(logging.INFO)
+
+    app = create_app()
+    # Export to HTML with all data included (on servers only with EXPORT_HTML=1)
+    if app.figures.settings['mode'] != 'production' or _env_flag('EXPORT_HTML'):
+        export_html(app.figures, open_browser=app.figures.settings['mode'] != 'production')
+    serve(app)
+
 
 if __name__ == '__main__':
-    # --- Export complete interactive visualization ---
-    import plotly.io as pio
-    import webbrowser
-    
-    # Configure HTML export
-    config = {
-        'scrollZoom': True,
-        'displayModeBar': True,
-        'responsive': True
-    }
-    
-    # Export to HTML with all data included
-    pio.write_html(
-        fig, 
-        "final-temperature-visualization.html",
-        config=config,
-        auto_open=True,
-        include_plotlyjs='cdn',  # Smaller file size
-        full_html=True,
-        include_mathjax='cdn'
-    )
-    print("Complete visualization saved to final-temperature-visualization.html")
-    port = int(os.environ.get("PORT", 8051))
-    app.run(debug=True, host="0.0.0.0", port=port)
+    main()
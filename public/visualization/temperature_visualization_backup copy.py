@@ -1,45 +1,37 @@
+import sys
+
 import pandas as pd
-import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import numpy as np
-from datetime import datetime
 
-# Helper function to load and standardize a month's data
-def load_and_standardize_csv(filename):
-    df = pd.read_csv(filename)
-    df['Date'] = pd.to_datetime(df['Date'])
-    df = df.rename(columns={
-        'Max Temperature': 'Max Temp',
-        'Min Temperature': 'Min Temp',
-        'Avg Temperature': 'Avg Temp'
-    })
-    return df
+# CSV loading (cache + parallel reader) is shared with temperature_visualization.py
+from temperature_data import align_to_reference_year, load_csvs_parallel, months
+from temperature_figures import daily_scatter_class
+
+
+# Concatenate the monthly frames that loaded; exit with a message when none did
+def concat_loaded(frames, year):
+    loaded = [df for df in frames if df is not None]
+    if not loaded:
+        sys.exit(f"No {year} data could be loaded (expected <month>_{year}_temperature_data.csv files)")
+    return pd.concat(loaded, ignore_index=True)
 
-# List of months for file naming
-months = [
-    'january', 'february', 'march', 'april', 'may', 'june',
-    'july', 'august', 'september', 'october', 'november', 'december'
-]
 
 # Load and concatenate 2024 data
 current_year = 2024
-current_dfs = []
-for month in months:
-    fname = f"{month}_{current_year}_temperature_data.csv"
-    current_dfs.append(load_and_standardize_csv(fname))
-df_2024 = pd.concat(current_dfs, ignore_index=True)
+current_dfs, _ = load_csvs_parallel(f"{month}_{current_year}_temperature_data.csv" for month in months)
+df_2024 = concat_loaded(current_dfs, current_year)
 
 # Load and concatenate 1990 data
 historical_year = 1990
-historical_dfs = []
-for month in months:
-    fname = f"{month}_{historical_year}_temperature_data.csv"
-    historical_dfs.append(load_and_standardize_csv(fname))
-df_1990 = pd.concat(historical_dfs, ignore_index=True)
+historical_dfs, _ = load_csvs_parallel(f"{month}_{historical_year}_temperature_data.csv" for month in months)
+df_1990 = concat_loaded(historical_dfs, historical_year)
 
 # Adjust historical dates to 2024 for comparison
 # (keeps month and day, changes year)
-df_1990['Date'] = df_1990['Date'].apply(lambda x: x.replace(year=2024))
+df_1990['Date'] = align_to_reference_year(df_1990['Date'], current_year)
+
+# Large overlays are drawn with WebGL (see WEBGL_POINT_THRESHOLD)
+line_trace = daily_scatter_class(3 * (len(df_2024) + len(df_1990)))
 
 # Create subplot figure
 fig = make_subplots(
@@ -71,7 +63,7 @@ current_data = [
 for year_label, df in current_data:
     # Maximum temperature
     fig.add_trace(
-        go.Scatter(
+        line_trace(
             x=df['Date'],
             y=df['Max Temp'],
             name=f'{year_label} Maximum',
@@ -86,7 +78,7 @@ for year_label, df in current_data:
     
     # Average temperature
     fig.add_trace(
-        go.Scatter(
+        line_trace(
             x=df['Date'],
             y=df['Avg Temp'],
             name=f'{year_label} Average',
@@ -101,7 +93,7 @@ for year_label, df in current_data:
     
     # Minimum temperature
     fig.add_trace(
-        go.Scatter(
+        line_trace(
             x=df['Date'],
             y=df['Min Temp'],
             name=f'{year_label} Minimum',
@@ -122,7 +114,7 @@ historical_data = [
 for year_label, df in historical_data:
     # Maximum temperature
     fig.add_trace(
-        go.Scatter(
+        line_trace(
             x=df['Date'],
             y=df['Max Temp'],
             name=f'{year_label} Maximum',
@@ -141,7 +133,7 @@ for year_label, df in historical_data:
     
     # Average temperature
     fig.add_trace(
-        go.Scatter(
+        line_trace(
             x=df['Date'],
             y=df['Avg Temp'],
             name=f'{year_label} Average',
@@ -160,7 +152,7 @@ for year_label, df in historical_data:
     
     # Minimum temperature
     fig.add_trace(
-        go.Scatter(
+        line_trace(
             x=df['Date'],
             y=df['Min Temp'],
             name=f'{year_label} Minimum',
@@ -0,0 +1,80 @@
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+
+from compact_export import compact_figure_payload
+
+
+# Python version of the page's decoder: the trace dicts with every {"$ref": n}
+# replaced by its array from the table
+def decode_payload(payload):
+    def unpack(spec):
+        return np.frombuffer(base64.b64decode(spec['bdata']), dtype=np.dtype(spec['dtype']))
+
+    def value(spec):
+        if spec['kind'] == 'numeric':
+            values = unpack(spec).astype(np.float64)
+            if 'shape' in spec:
+                values = values.reshape([int(size) for size in spec['shape'].split(',')])
+            return values.tolist()
+        if spec['kind'] == 'date':
+            ms = unpack(spec).astype(np.int64) * spec['unit']
+            return [pd.Timestamp(v, unit='ms').strftime('%Y-%m-%d') for v in ms]
+        if spec['kind'] == 'category':
+            return [spec['values'][code] for code in unpack(spec)]
+        return spec['values']
+
+    decoded = [value(spec) for spec in payload['arrays']]
+
+    def resolve(obj):
+        if isinstance(obj, list):
+            return [resolve(v) for v in obj]
+        if isinstance(obj, dict):
+            if set(obj) == {'$ref'}:
+                return decoded[obj['$ref']]
+            return {key: resolve(v) for key, v in obj.items()}
+        return obj
+
+    return resolve(payload['data'])
+
+
+def test_round_trip_with_timestamps_and_repeated_series():
+    dates = pd.date_range('2024-01-01', periods=31)
+    temperatures = np.linspace(40.5, 70.5, 31)
+    fig = go.Figure([
+        go.Scatter(x=dates, y=temperatures, name='2024 Max'),
+        go.Scatter(x=dates, y=temperatures, name='copy'),
+        # Timestamp scalars, as the consolidated month shading has
+        go.Bar(x=[pd.Timestamp('2024-01-01') + pd.Timedelta(days=15)], y=[1],
+               base=[0], width=[pd.Timedelta(days=31).total_seconds() * 1000]),
+        go.Heatmap(z=np.arange(40, dtype=float).reshape(10, 4)),
+    ])
+    fig_dict = fig.to_plotly_json()
+    fig_dict['data'][2]['x'] = [pd.Timestamp('2024-01-16')]
+
+    payload = compact_figure_payload(fig_dict)
+    json.loads(to_json_plotly(payload))  # serializable
+    data = decode_payload(payload)
+
+    # The repeated numeric series and date axis are each stored once
+    assert data[0]['y'] == temperatures.tolist()
+    assert payload['data'][0]['y'] == payload['data'][1]['y']
+    assert payload['data'][0]['x'] == payload['data'][1]['x']
+    assert len(payload['arrays']) == 3
+    assert data[0]['x'] == [d.strftime('%Y-%m-%d') for d in dates]
+    assert data[2]['x'] == ['2024-01-16T00:00:00']
+    assert data[3]['z'] == np.arange(40, dtype=float).reshape(10, 4).tolist()
+
+
+def test_typed_arrays_are_narrowed_and_interned():
+    series = np.arange(100, dtype=np.float64)
+    fig_dict = go.Figure([go.Scatter(y=series), go.Scatter(y=series)]).to_dict()
+    assert 'bdata' in fig_dict['data'][0]['y']
+    payload = compact_figure_payload(fig_dict)
+    assert payload['data'][0]['y'] == payload['data'][1]['y'] == {'$ref': 0}
+    assert payload['arrays'][0]['dtype'] == 'f4'
+    assert decode_payload(payload)[0]['y'] == series.tolist()
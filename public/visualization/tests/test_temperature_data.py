@@ -0,0 +1,19 @@
+import pandas as pd
+
+from temperature_data import load_and_standardize_csv
+
+CSV = """Date,Station,Name,Max Temp,Min Temp,Avg Temp,HDD
+2024-01-01,PHX,Phoenix,65,44,54.5,10
+2024-01-02,,Phoenix,66,,55.0,10
+2024-01-03,PHX,,64,42,53.0,12
+"""
+
+
+def test_warm_load_matches_cold_load(tmp_path):
+    path = tmp_path / 'january_2024_temperature_data.csv'
+    path.write_text(CSV, encoding='utf-8')
+    cold = load_and_standardize_csv(path, rebuild=True)
+    warm = load_and_standardize_csv(path)
+    pd.testing.assert_frame_equal(warm, cold)
+    assert warm['Station'].isna().tolist() == [False, True, False]
+    assert warm['Name'].isna().tolist() == [False, False, True]
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from temperature_dataset import TemperatureDataset
+from temperature_stats import streaming_monthly_aggregates
+
+
+def _daily_csv(missing_marker=''):
+    dates = pd.date_range('2024-01-01', '2024-02-29')
+    rng = np.random.default_rng(0)
+    high = np.round(70 + rng.normal(0, 5, len(dates)))
+    low = np.round(high - 25 + rng.normal(0, 3, len(dates)))
+    rows = ['Date,Max Temperature,Min Temperature,Avg Temperature,HDD']
+    for i, (date, max_temp, min_temp) in enumerate(zip(dates, high, low)):
+        shown_min = missing_marker if i == 10 else f'{min_temp:.0f}'
+        rows.append(f'{date:%Y-%m-%d},{max_temp:.0f},{shown_min},{(max_temp + min_temp) / 2},0')
+    return '\n'.join(rows) + '\n'
+
+
+def test_streaming_matches_loaded_aggregates_with_missing_markers(tmp_path):
+    (tmp_path / 'january_2024_temperature_data.csv').write_text(_daily_csv(), encoding='utf-8')
+    streamed_csv = tmp_path / 'export.csv'
+    streamed_csv.write_text(_daily_csv(missing_marker='M'), encoding='utf-8')
+
+    expected = TemperatureDataset(tmp_path).load().monthly_aggregates()
+    streamed = streaming_monthly_aggregates(streamed_csv, 'phoenix', chunksize=7)
+    pd.testing.assert_frame_equal(streamed, expected, check_dtype=False)
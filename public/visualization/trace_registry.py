@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+
+class TraceRegistry:
+    # Records the view/year/stat tags of every trace added to a figure so
+    # visibility masks can be produced for any view in a single pass,
+    # instead of counting traces by hand and testing list membership. With
+    # fig None only the tags are recorded (figure dicts, see fast_figures.py);
+    # insert/replace/remove need a figure.
+
+    def __init__(self, fig=None):
+        self.fig = fig
+        self.tags = []
+        self._by_view = defaultdict(list)
+
+    def __len__(self):
+        return len(self.tags)
+
+    # entries are (trace, tags) pairs as returned by the temperature_figures
+    # trace builders; tags is a dict with 'view' and optionally 'year'/'stat'.
+    # All traces are appended to the figure in one add_traces call.
+    def add_all(self, entries):
+        entries = list(entries)
+        start = len(self.tags)
+        for offset, (_, tags) in enumerate(entries):
+            self.tags.append(tags)
+            self._by_view[tags.get('view')].append(start + offset)
+        if self.fig is not None:
+            self.fig.add_traces([trace for trace, _ in entries])
+        return list(range(start, start + len(entries)))
+
+    # Insert entries before the trace at position (traces after it shift up)
+    def insert(self, position, entries):
+        entries = list(entries)
+        count = len(self.fig.data)
+        self.fig.add_traces([trace for trace, _ in entries])
+        order = list(range(position)) + list(range(count, count + len(entries))) + list(range(position, count))
+        self.fig.data = [self.fig.data[i] for i in order]
+        self.tags[position:position] = [tags for _, tags in entries]
+        self._reindex()
+        return list(range(position, position + len(entries)))
+
+    # Put trace in place of the trace at index, keeping its tags
+    def replace(self, index, trace):
+        count = len(self.fig.data)
+        self.fig.add_trace(trace)
+        order = list(range(count))
+        order[index] = count
+        self.fig.data = [self.fig.data[i] for i in order]
+
+    def remove(self, indices):
+        dropped = set(indices)
+        self.fig.data = [trace for i, trace in enumerate(self.fig.data) if i not in dropped]
+        self.tags = [tags for i, tags in enumerate(self.tags) if i not in dropped]
+        self._reindex()
+
+    def _reindex(self):
+        self._by_view = defaultdict(list)
+        for i, tags in enumerate(self.tags):
+            self._by_view[tags.get('view')].append(i)
+
+    # Indices of traces matching every given tag
+    def indices(self, view=None, **tags):
+        candidates = self._by_view[view] if view is not None else range(len(self.tags))
+        return [i for i in candidates if all(self.tags[i].get(k) == v for k, v in tags.items())]
+
+    # Visibility list with True for the traces of view
+    def visibility(self, view):
+        mask = [False] * len(self.tags)
+        for i in self._by_view[view]:
+            mask[i] = True
+        return mask
@@ -0,0 +1,29 @@
+# WSGI entry point for production serving, e.g.
+#   gunicorn --config gunicorn.conf.py wsgi:server
+# The data is loaded and every default figure built once at import (with
+# gunicorn's preload_app in the master process), so forked workers share
+# them instead of each running the pipeline.
+import importlib.util
+import logging
+import sys
+from pathlib import Path
+
+try:
+    import temperature_visualization
+except ModuleNotFoundError:
+    # The app script may carry a " copy" suffix (like the CSVs, see
+    # temperature_dataset.FILE_PATTERN), which import can't resolve
+    spec = importlib.util.spec_from_file_location(
+        'temperature_visualization', Path(__file__).with_name('temperature_visualization copy.py'))
+    temperature_visualization = importlib.util.module_from_spec(spec)
+    sys.modules['temperature_visualization'] = temperature_visualization
+    spec.loader.exec_module(temperature_visualization)
+
+create_app = temperature_visualization.create_app
+settings_from_env = temperature_visualization.settings_from_env
+
+logging.basicConfig(format='%(message)s')
+logging.getLogger('temperature.stages').setLevel(logging.INFO)
+
+app = create_app(settings=settings_from_env(default_mode='production'))
+server = app.server